@@ -0,0 +1,133 @@
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from recommend_engine import HYBRID_WEIGHTS, RecommendationEngine, top_scores
+
+# Users scored per matrix product; bounds the size of each sparse score block
+DEFAULT_CHUNK_USERS = 512
+
+# Chunks submitted ahead per worker; bounds how many finished results wait in memory to be written
+IN_FLIGHT_PER_WORKER = 2
+
+# Score blocks each kind of recommendation is built from, with their weights
+KINDS = {
+    'viewed_by_similar_users': {'VIEWED': 1},
+    'hybrid': HYBRID_WEIGHTS,
+}
+
+_engine = None
+
+
+def _init_worker(engine):
+    # Each worker process receives the engine once, not once per chunk
+    global _engine
+    _engine = engine
+
+
+def score_chunk(engine, users, weights, limit):
+    scores = sum(weight * engine.co_interaction_matrix(users, action) for action, weight in weights.items())
+    scores = scores.tocsr()
+
+    user_column, rank_column, product_column, score_column = [], [], [], []
+    for row, user in enumerate(users):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        product_ids, row_scores = top_scores(engine.product_ids[scores.indices[start:end]],
+                                             scores.data[start:end], limit)
+        user_column.extend([engine.user_ids[user]] * len(product_ids))
+        rank_column.extend(range(1, len(product_ids) + 1))
+        product_column.extend(product_ids)
+        score_column.extend(row_scores)
+
+    return pd.DataFrame({'user_id': user_column, 'rank': rank_column,
+                         'product_id': product_column, 'score': np.asarray(score_column, dtype=np.int64)})
+
+
+def _score_chunk_in_worker(args):
+    users, weights, limit = args
+    return score_chunk(_engine, users, weights, limit)
+
+
+def _bounded_map(executor, fn, items, in_flight):
+    # executor.map submits every item up front; this keeps at most in_flight futures outstanding
+    window = deque()
+    for item in items:
+        if len(window) >= in_flight:
+            yield window.popleft().result()
+        window.append(executor.submit(fn, item))
+    while window:
+        yield window.popleft().result()
+
+
+class _ResultWriter:
+    """Appends result chunks to CSV, or to Parquet when the path ends in .parquet."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self.writer = None
+        self.rows = 0
+
+    def write(self, chunk):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table)
+        else:
+            chunk.to_csv(self.path, mode='w' if self.rows == 0 else 'a', header=self.rows == 0, index=False)
+        self.rows += len(chunk)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def recommend_for_users(engine, output, user_ids='all', kind='viewed_by_similar_users', limit=10,
+                        chunk_size=DEFAULT_CHUNK_USERS, workers=None):
+    weights = KINDS[kind]
+    users = np.arange(len(engine.user_ids)) if user_ids == 'all' else engine.user_positions(user_ids)
+    chunks = [(users[start:start + chunk_size], weights, limit) for start in range(0, len(users), chunk_size)]
+    print(f"Scoring {len(users)} users in {len(chunks)} chunks...")
+
+    started = time.perf_counter()
+    writer = _ResultWriter(output)
+    try:
+        # Results are written in order as they come back, with only a bounded window of chunks
+        # submitted or waiting to be written, so the output never accumulates in memory
+        in_flight = IN_FLIGHT_PER_WORKER * (workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(engine,)) as executor:
+            for done, result in enumerate(_bounded_map(executor, _score_chunk_in_worker, chunks, in_flight), start=1):
+                writer.write(result)
+                print(f"Chunk {done}/{len(chunks)}: {writer.rows} rows written "
+                      f"({time.perf_counter() - started:.1f}s)")
+    finally:
+        writer.close()
+
+    print(f"Wrote {writer.rows} recommendations for {len(users)} users to {output}.")
+    return writer.rows
+
+
+if __name__ == "__main__":
+    from db_clone.connector.connect import get_graph
+
+    parser = argparse.ArgumentParser(description="Compute recommendations for many users in one pass.")
+    parser.add_argument('--users', nargs='*', type=int, help="user ids to score (default: all users)")
+    parser.add_argument('--kind', choices=sorted(KINDS), default='viewed_by_similar_users')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_USERS)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', default='recommendations.csv', help=".csv or .parquet")
+    args = parser.parse_args()
+
+    engine = RecommendationEngine.from_graph(get_graph())
+    recommend_for_users(engine, args.output, user_ids=args.users or 'all', kind=args.kind, limit=args.limit,
+                        chunk_size=args.chunk_size, workers=args.workers)
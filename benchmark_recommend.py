@@ -0,0 +1,65 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from db_clone.connector.connect import get_graph
+from run_4 import FANOUT, recommend_products
+
+# Sample users with the size of their co-interaction neighbourhood: how many (product, other user)
+# pairs an uncapped hybrid query would have to expand. The sample is drawn first, so only the
+# sampled users' neighbourhoods are measured.
+NEIGHBOURHOOD_QUERY = """
+MATCH (u:User)
+WHERE (u)-[:VIEWED|BOUGHT|SEARCHED]->(:Product)
+WITH u ORDER BY rand() LIMIT $sample
+MATCH (u)-[:VIEWED|BOUGHT|SEARCHED]->(p:Product)
+WITH u, sum(size([(p)<-[:VIEWED|BOUGHT|SEARCHED]-(other:User) | other])) AS neighbourhood
+RETURN u.user_id AS user_id, neighbourhood
+"""
+
+
+def time_user(graph, user_id, fanout, repeats):
+    # __wrapped__ skips the result cache so every call reaches Neo4j
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        recommend_products.__wrapped__(graph, user_id, fanout=fanout)
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+def benchmark(graph, sample=50, fanouts=tuple(FANOUT), buckets=5, repeats=3):
+    users = graph.run(NEIGHBOURHOOD_QUERY, sample=sample).to_data_frame()
+    if users.empty:
+        print("No users with interactions to benchmark.")
+        return users
+    print(f"Benchmarking {len(users)} users, neighbourhood sizes "
+          f"{users['neighbourhood'].min()} to {users['neighbourhood'].max()}...")
+
+    rows = []
+    for fanout in fanouts:
+        for user_id, neighbourhood in users.itertuples(index=False):
+            rows.append({'fanout': fanout, 'neighbourhood': neighbourhood,
+                         'latency_ms': time_user(graph, user_id, fanout, repeats)})
+        print(f"fanout={fanout}: done")
+
+    results = pd.DataFrame(rows)
+    results['bucket'] = pd.qcut(results['neighbourhood'], q=buckets, duplicates='drop')
+    summary = results.groupby(['fanout', 'bucket'], observed=True)['latency_ms'].agg(
+        median='median', p95=lambda latencies: np.percentile(latencies, 95), users='count')
+    print(summary.round(2).to_string())
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency of recommend_products against neighbourhood size.")
+    parser.add_argument('--sample', type=int, default=50, help="number of random users to time")
+    parser.add_argument('--fanouts', nargs='*', choices=sorted(FANOUT), default=list(FANOUT),
+                        help="fan-out strategies from run_4.FANOUT to compare")
+    parser.add_argument('--buckets', type=int, default=5, help="neighbourhood size quantile buckets")
+    parser.add_argument('--repeats', type=int, default=3, help="runs per user; the fastest is kept")
+    args = parser.parse_args()
+
+    benchmark(get_graph(), sample=args.sample, fanouts=args.fanouts, buckets=args.buckets, repeats=args.repeats)
@@ -0,0 +1,169 @@
+import argparse
+import gzip
+import os
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from db_clone.connector.connect import DBConnectionLocal
+from extract import DEFAULT_CHUNK_SIZE, stream_frames
+from vendor_extract import DIMENSION_QUERIES, FACT_QUERIES, aggregate_query
+
+OUTPUT_DIR = 'neo4j_import'
+
+# Fast gzip: the writers should keep up with MySQL, and neo4j-admin reads .gz directly
+GZIP_LEVEL = 1
+
+# neo4j-admin parses localdatetime columns from ISO 8601
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+EDGE_PROPERTIES = [('event_count', 'count:long'), ('first_seen', 'first_seen:localdatetime'),
+                   ('last_seen', 'last_seen:localdatetime')]
+
+
+def _within(query, column, dimension, key):
+    # Keep only rows whose endpoint is exported as a node: neo4j-admin aborts an import once it has
+    # seen more than --bad-tolerance relationships to missing nodes
+    return f"""
+        SELECT * FROM ({query}) AS facts
+        WHERE facts.{column} IN (SELECT {key} FROM ({DIMENSION_QUERIES[dimension]}) AS {dimension})
+    """
+
+
+# The raw logs hold NULL, 0 and unknown user ids (run_1.py filters them), so both ends are checked
+VIEWED_QUERY = _within(_within(aggregate_query(*FACT_QUERIES['views']), 'product_id', 'products', 'product_id'),
+                       'user_id', 'users', 'user_id')
+BOUGHT_QUERY = _within(_within(aggregate_query(*FACT_QUERIES['buys']), 'product_id', 'products', 'product_id'),
+                       'user_id', 'users', 'user_id')
+SEARCHED_QUERY = _within(aggregate_query(*FACT_QUERIES['searches']), 'user_id', 'users', 'user_id')
+
+# Every (user, vendor) pair with a view, buy or search, once
+INTERACTED_WITH_QUERY = f"""
+    SELECT events.user_id, products.vendor_id
+    FROM (
+        SELECT user_id, product_id FROM product_view_logs
+        UNION
+        SELECT user_id, product_id FROM buy_logs
+    ) AS events
+    JOIN ({DIMENSION_QUERIES['products']}) AS products ON products.product_id = events.product_id
+    JOIN ({DIMENSION_QUERIES['users']}) AS users ON users.user_id = events.user_id
+
+    UNION
+
+    SELECT user_id, vendor_id FROM ({SEARCHED_QUERY}) AS searches
+"""
+
+# One CSV per label / relationship type, as (kind, label or type, query, [(column, header field)], dedupe).
+# Ids are ID-space qualified, so vendor 5 and user 5 stay distinct nodes. Relationship queries are
+# already unique (primary keys, GROUP BY, UNION) and only reach exported nodes; node files are
+# also deduplicated on their id as they are written.
+FILES = {
+    'users': ('nodes', 'User', DIMENSION_QUERIES['users'],
+              [('user_id', 'user_id:ID(User)'), ('user_name', 'user_name')], 'user_id'),
+    'vendors': ('nodes', 'Vendor', DIMENSION_QUERIES['vendors'],
+                [('vendor_id', 'vendor_id:ID(Vendor)'), ('vendor_name', 'vendor_name')], 'vendor_id'),
+    'categories': ('nodes', 'Category', DIMENSION_QUERIES['categories'],
+                   [('category_id', 'category_id:ID(Category)'), ('category_name', 'category_name')],
+                   'category_id'),
+    'products': ('nodes', 'Product', DIMENSION_QUERIES['products'],
+                 [('product_id', 'product_id:ID(Product)'), ('product_name', 'product_name')], 'product_id'),
+    'owns': ('relationships', 'OWNS', DIMENSION_QUERIES['products'],
+             [('vendor_id', ':START_ID(Vendor)'), ('product_id', ':END_ID(Product)')], None),
+    'belongs_to': ('relationships', 'BELONGS_TO', DIMENSION_QUERIES['products'],
+                   [('product_id', ':START_ID(Product)'), ('category_id', ':END_ID(Category)')], None),
+    'viewed': ('relationships', 'VIEWED', VIEWED_QUERY,
+               [('user_id', ':START_ID(User)'), ('product_id', ':END_ID(Product)')] + EDGE_PROPERTIES, None),
+    'bought': ('relationships', 'BOUGHT', BOUGHT_QUERY,
+               [('user_id', ':START_ID(User)'), ('product_id', ':END_ID(Product)')] + EDGE_PROPERTIES, None),
+    'searched': ('relationships', 'SEARCHED', SEARCHED_QUERY,
+                 [('user_id', ':START_ID(User)'), ('vendor_id', ':END_ID(Vendor)')] + EDGE_PROPERTIES, None),
+    'interacted_with': ('relationships', 'INTERACTED_WITH', INTERACTED_WITH_QUERY,
+                        [('user_id', ':START_ID(User)'), ('vendor_id', ':END_ID(Vendor)')], None),
+}
+
+
+def _open(path, compress):
+    if compress:
+        return gzip.open(path, 'wt', newline='', encoding='utf-8', compresslevel=GZIP_LEVEL)
+    return open(path, 'w', newline='', encoding='utf-8')
+
+
+def write_file(engine, name, output_dir, compress=False, chunksize=DEFAULT_CHUNK_SIZE):
+    """Stream one label's rows from MySQL into ``<name>.csv[.gz]`` plus ``<name>_header.csv``.
+
+    The data file is written under a temporary name and renamed when complete, so an
+    interrupted export never leaves a truncated file for neo4j-admin to pick up.
+    """
+    kind, label, query, columns, dedupe = FILES[name]
+    started = time.perf_counter()
+    header_path = os.path.join(output_dir, f'{name}_header.csv')
+    data_path = os.path.join(output_dir, f'{name}.csv' + ('.gz' if compress else ''))
+
+    with open(header_path, 'w', newline='', encoding='utf-8') as f:
+        f.write(','.join(header for _, header in columns) + '\n')
+
+    written, seen = 0, set()
+    with _open(data_path + '.tmp', compress) as f:
+        for frame in stream_frames(engine, query, chunksize=chunksize):
+            frame = frame[[column for column, _ in columns]]
+            if dedupe:
+                frame = frame.drop_duplicates(dedupe)
+                frame = frame[~frame[dedupe].isin(seen)]
+                seen.update(frame[dedupe])
+            frame.to_csv(f, header=False, index=False, date_format=DATETIME_FORMAT)
+            written += len(frame)
+    os.replace(data_path + '.tmp', data_path)
+
+    print(f"{label}: {written} {kind[:-1] if written == 1 else kind} -> {data_path} "
+          f"({time.perf_counter() - started:.1f}s)")
+    return kind, label, header_path, data_path
+
+
+def import_command(files, database='neo4j'):
+    args = ['neo4j-admin', 'database', 'import', 'full',
+            # Every id is a MySQL integer key; stored as a long, as the transactional loaders do
+            '--id-type=INTEGER',
+            '--overwrite-destination=true']
+    for kind, label, header_path, data_path in files:
+        args.append(f'--{kind}={label}={header_path},{data_path}')
+    args.append(database)
+    return ' '.join(shlex.quote(arg) for arg in args)
+
+
+def export_import_files(engine, output_dir=OUTPUT_DIR, compress=False, workers=None, chunksize=DEFAULT_CHUNK_SIZE,
+                        database='neo4j'):
+    os.makedirs(output_dir, exist_ok=True)
+    started = time.perf_counter()
+
+    # One writer thread (and so one pooled MySQL connection) per label; the scans and gzip both
+    # release the GIL, so the files are produced side by side
+    with ThreadPoolExecutor(max_workers=workers or len(FILES)) as executor:
+        futures = {executor.submit(write_file, engine, name, output_dir, compress, chunksize): name for name in FILES}
+        results = {futures[future]: future.result() for future in as_completed(futures)}
+
+    # Arguments in FILES order, so the command reads nodes first whatever order the writers finished in
+    command = import_command([results[name] for name in FILES], database)
+    script = os.path.join(output_dir, 'import.sh')
+    with open(script, 'w') as f:
+        f.write('#!/bin/sh\n# Run with the database stopped\n' + command + '\n')
+    os.chmod(script, 0o755)
+
+    print(f"Exported {len(FILES)} files in {time.perf_counter() - started:.1f}s. With Neo4j stopped, run:")
+    print(f"  {command}")
+    # --baseline creates the constraints and indexes first, so --refresh-degrees runs on an indexed graph
+    print("then start Neo4j and run `python sync.py --baseline` and `python sync.py --refresh-degrees`.")
+    return command
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the run_5.py graph as neo4j-admin import CSVs.")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--compress', action='store_true', help="gzip the data files")
+    parser.add_argument('--workers', type=int, default=None, help="parallel writers (default: one per file)")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--database', default='neo4j', help="database the import command targets")
+    args = parser.parse_args()
+
+    engine = DBConnectionLocal().create_db_connection()
+    export_import_files(engine, output_dir=args.output_dir, compress=args.compress, workers=args.workers,
+                        chunksize=args.chunksize, database=args.database)
@@ -1,10 +1,77 @@
 import os
+import threading
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
 
 
 load_dotenv()
 
+# Connection pool settings shared by every engine in the process
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 3600))
+
+NEO4J_URI = os.getenv('NEO4J_URI', 'bolt://localhost:7687')
+NEO4J_USER = os.getenv('NEO4J_USER', 'neo4j')
+NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD', '$Verine123')
+NEO4J_POOL_SIZE = int(os.getenv('NEO4J_POOL_SIZE', 50))
+
+# One engine per DSN and one Neo4j client per URI/user for the whole process
+_engines = {}
+_graphs = {}
+_drivers = {}
+_lock = threading.Lock()
+
+
+def get_engine(dsn, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW):
+    with _lock:
+        if dsn not in _engines:
+            # pre_ping replaces connections MySQL closed while they sat idle in the pool
+            _engines[dsn] = create_engine(dsn, echo=False, pool_size=pool_size, max_overflow=max_overflow,
+                                          pool_pre_ping=True, pool_recycle=POOL_RECYCLE)
+        return _engines[dsn]
+
+
+def get_graph(uri=NEO4J_URI, user=NEO4J_USER, password=NEO4J_PASSWORD, pool_size=NEO4J_POOL_SIZE):
+    from py2neo import Graph
+
+    with _lock:
+        if (uri, user) not in _graphs:
+            # max_connections bounds py2neo's own connection pool, as max_connection_pool_size does for the driver
+            _graphs[(uri, user)] = Graph(uri, auth=(user, password), max_connections=pool_size)
+        return _graphs[(uri, user)]
+
+
+def get_driver(uri=NEO4J_URI, user=NEO4J_USER, password=NEO4J_PASSWORD, pool_size=NEO4J_POOL_SIZE):
+    from neo4j import GraphDatabase
+
+    with _lock:
+        if (uri, user) not in _drivers:
+            # The driver keeps its own bounded session pool; sessions borrowed from it are cheap
+            _drivers[(uri, user)] = GraphDatabase.driver(uri, auth=(user, password),
+                                                         max_connection_pool_size=pool_size)
+        return _drivers[(uri, user)]
+
+
+def get_async_driver(uri=NEO4J_URI, user=NEO4J_USER, password=NEO4J_PASSWORD, pool_size=NEO4J_POOL_SIZE):
+    from neo4j import AsyncGraphDatabase
+
+    # Async drivers belong to the event loop that uses them, so they are created per call site
+    # (once per service process) rather than cached alongside the blocking ones
+    return AsyncGraphDatabase.driver(uri, auth=(user, password), max_connection_pool_size=pool_size)
+
+
+def dispose_all():
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        for driver in _drivers.values():
+            driver.close()
+        _engines.clear()
+        _graphs.clear()
+        _drivers.clear()
+
+
 # Your connection classes
 class DBConnectionOnline:
     user = os.getenv('DB_USER')
@@ -14,8 +81,8 @@ class DBConnectionOnline:
     database = os.getenv('DB_NAME')
 
     def create_db_connection(self):
-        conn = create_engine('mysql+pymysql://' + self.user + ':' + self.password + '@' + self.host + ':' + str(self.port) + '/' + self.database,
-                             echo=False)
+        # Returns the shared pooled engine for this DSN rather than building a new one
+        conn = get_engine('mysql+pymysql://' + self.user + ':' + self.password + '@' + self.host + ':' + str(self.port) + '/' + self.database)
 
         return conn
 
@@ -29,5 +96,6 @@ class DBConnectionLocal:
     database = os.getenv('LDB_NAME')
 
     def create_db_connection(self):
-        conn = create_engine(f'mysql+pymysql://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}', echo=False)
+        # Returns the shared pooled engine for this DSN rather than building a new one
+        conn = get_engine(f'mysql+pymysql://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}')
         return conn
@@ -1,6 +1,31 @@
 from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.exc import SQLAlchemyError
 from connector.connect import DBConnectionLocal, DBConnectionOnline
+import argparse
+import hashlib
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from graphlib import CycleError, TopologicalSorter
+
+# Rows streamed from the online table and written per executemany call
+CHUNK_SIZE = 5000
+
+# Tables copied concurrently; every worker opens its own connections
+MAX_WORKERS = 4
+
+# Local bookkeeping table holding per-table high-water marks for incremental clones
+STATE_TABLE = '_clone_state'
+
+# Columns tried, in order, as a table's high-water mark. updated_at comes first so edits to
+# existing rows of mutable tables (users, products, ...) are picked up; id only catches new rows,
+# which is enough for the append-only log tables that have no updated_at.
+WATERMARK_COLUMNS = ['updated_at', 'id', 'created_at']
+
+# Seconds a row must have existed before a high-water mark may pass it. Ids and timestamps are
+# handed out at insert/update, not at commit, so a row committing late could otherwise land below
+# a mark that has already moved on (the same hole sync.py's SETTLE_SECONDS closes).
+SETTLE_SECONDS = 60
 
 def clone_table_structure(table_name):
     try:
@@ -27,61 +52,107 @@ def clone_table_structure(table_name):
             # Create table structure in the local database
             local_connection.execute(text(table_creation_query))
             print(f"Table {table_name} structure copied successfully.")
+        return True
 
     except SQLAlchemyError as e:
         print(f"Error during table structure cloning: {str(e)}")
+        return False
     finally:
         print("Table structure cloning completed.")
 
 
 
-def clone_table_data(table_name):
+def _insert_chunk(local_connection, insert_query, rows, table_name):
+    # Write the whole chunk as one multi-row executemany in its own transaction.
+    # Returns the rows inserted and the position of the first row that failed (None if none did).
     try:
-        # Connect to online and local databases (new connections)
-        online_conn = DBConnectionOnline().create_db_connection()
-        local_conn = DBConnectionLocal().create_db_connection()
+        with local_connection.begin():
+            local_connection.execute(text(insert_query), rows)
+        return len(rows), None
+    except SQLAlchemyError as chunk_error:
+        print(f"Bulk insert of {len(rows)} rows into {table_name} failed, retrying row by row: {str(chunk_error)}")
 
-        print(f"Cloning data for table {table_name}...")
+    # Fall back to single-row inserts for this chunk only so one bad row doesn't drop the rest
+    inserted = 0
+    first_failed = None
+    for position, row_dict in enumerate(rows):
+        try:
+            with local_connection.begin():
+                local_connection.execute(text(insert_query), row_dict)
+            inserted += 1
+        except SQLAlchemyError as insert_error:
+            print(f"Error during data insert for row {row_dict}: {str(insert_error)}")
+            if first_failed is None:
+                first_failed = position
+    return inserted, first_failed
 
-        # Copy data from the online database
-        with online_conn.connect() as online_connection:
-            inspector_online = inspect(online_conn)
-            columns = [col['name'] for col in inspector_online.get_columns(table_name)]
-            # Fetch data from the online table
-            data = online_connection.execute(text(f"SELECT * FROM {table_name}")).fetchall()
-
-            if data:
-                print(f"Fetched {len(data)} rows from {table_name}.")
-
-                # Insert data into the local database
-                column_list = ', '.join(columns)
-                placeholders = ', '.join([f":{col}" for col in columns])  # Named placeholders
-                insert_query = f"INSERT INTO {table_name} ({column_list}) VALUES ({placeholders})"
-
-                with local_conn.connect() as local_connection:
-                    with local_connection.begin() as transaction:
-                        local_connection.execute(text("SET FOREIGN_KEY_CHECKS=0"))  # Disable foreign key checks temporarily
-                        try:
-                            for row in data:
-                                row_dict = {col: row[idx] for idx, col in enumerate(columns)}
-
-                                # Try to insert the row and catch any integrity errors
-                                try:
-                                    #print(f"Inserting row: {row_dict}")
-                                    local_connection.execute(text(insert_query), row_dict)
-                                except SQLAlchemyError as insert_error:
-                                    print(f"Error during data insert for row {row_dict}: {str(insert_error)}")
-                                    # Skip this row due to error
-                                    continue
-                            print(f"Data copied for table {table_name}.")
-                        except SQLAlchemyError as overall_error:
-                            print(f"Error during data cloning: {str(overall_error)}")
-                            transaction.rollback()  # Rollback on error
-                        finally:
-                            local_connection.execute(text("SET FOREIGN_KEY_CHECKS=1"))  # Re-enable foreign key checks
 
-            else:
-                print(f"No data found for table {table_name}.")
+def _build_insert_query(table_name, columns, upsert=False):
+    column_list = ', '.join(columns)
+    placeholders = ', '.join([f":{col}" for col in columns])  # Named placeholders
+    insert_query = f"INSERT INTO {table_name} ({column_list}) VALUES ({placeholders})"
+    if upsert:
+        # Rows already copied by an earlier run are refreshed instead of rejected
+        updates = ', '.join([f"{col} = VALUES({col})" for col in columns])
+        insert_query += f" ON DUPLICATE KEY UPDATE {updates}"
+    return insert_query
+
+
+def _stream_copy(table_name, select_query, params=None, chunk_size=CHUNK_SIZE, upsert=False):
+    # Connect to online and local databases (new connections)
+    online_conn = DBConnectionOnline().create_db_connection()
+    local_conn = DBConnectionLocal().create_db_connection()
+
+    started = time.perf_counter()
+    fetched = 0
+    inserted = 0
+    last_row = None
+
+    failed = False
+
+    # Stream the source through a server-side cursor instead of fetchall()
+    with online_conn.connect().execution_options(stream_results=True) as online_connection, \
+            local_conn.connect() as local_connection:
+        result = online_connection.execute(text(select_query), params or {})
+        columns = list(result.keys())
+        insert_query = _build_insert_query(table_name, columns, upsert=upsert)
+
+        with local_connection.begin():
+            local_connection.execute(text("SET FOREIGN_KEY_CHECKS=0"))  # Disable foreign key checks temporarily
+        try:
+            for chunk in result.partitions(chunk_size):
+                rows = [dict(zip(columns, row)) for row in chunk]
+                fetched += len(rows)
+                chunk_inserted, first_failed = _insert_chunk(local_connection, insert_query, rows, table_name)
+                inserted += chunk_inserted
+                # last_row is how far a high-water mark may move: never past a row that wasn't written
+                if failed:
+                    continue
+                if first_failed is not None:
+                    failed = True
+                    if first_failed == 0:
+                        continue
+                    rows = rows[:first_failed]
+                last_row = rows[-1]
+        finally:
+            with local_connection.begin():
+                local_connection.execute(text("SET FOREIGN_KEY_CHECKS=1"))  # Re-enable foreign key checks
+
+    elapsed = time.perf_counter() - started
+    if fetched:
+        print(f"Data copied for table {table_name}: {inserted}/{fetched} rows in {elapsed:.1f}s "
+              f"({inserted / elapsed:.0f} rows/s).")
+    else:
+        print(f"No data found for table {table_name}.")
+    # complete is False when some row couldn't be written; no mark may then cover the whole table
+    return inserted, last_row, not failed
+
+
+def clone_table_data(table_name, chunk_size=CHUNK_SIZE):
+    try:
+        print(f"Cloning data for table {table_name}...")
+        inserted, _, _ = _stream_copy(table_name, f"SELECT * FROM {table_name}", chunk_size=chunk_size)
+        return inserted
 
     except SQLAlchemyError as e:
         print(f"Error during data cloning: {str(e)}")
@@ -89,6 +160,166 @@ def clone_table_data(table_name):
         print("Data cloning completed.")
 
 
+def _schema_hash(online_connection, table_name):
+    table_creation_query = online_connection.execute(text(f"SHOW CREATE TABLE {table_name}")).fetchone()[1]
+    # AUTO_INCREMENT=N moves with every insert and isn't a structural change
+    table_creation_query = re.sub(r" AUTO_INCREMENT=\d+", "", table_creation_query)
+    return hashlib.sha256(table_creation_query.encode()).hexdigest()
+
+
+def online_schema_hashes(tables):
+    online_conn = DBConnectionOnline().create_db_connection()
+    with online_conn.connect() as online_connection:
+        return {table: _schema_hash(online_connection, table) for table in tables}
+
+
+def _watermark_column(inspector, table_name):
+    columns = {col['name']: col for col in inspector.get_columns(table_name)}
+    for name in WATERMARK_COLUMNS:
+        if name not in columns:
+            continue
+        # An id only works as a high-water mark if MySQL hands it out in increasing order
+        if name == 'id' and not columns[name].get('autoincrement'):
+            continue
+        return name
+    return None
+
+
+def _settled(table_name, watermark_column, columns):
+    # Condition keeping only rows old enough for the mark to pass; None if the table has no way to tell
+    if watermark_column != 'id':
+        return f"{watermark_column} < NOW() - INTERVAL :settle SECOND"
+    if 'created_at' in columns:
+        # Stop just below the first id inserted within the window; ~0 (max BIGINT UNSIGNED) if there is none
+        return f"""id < COALESCE((
+            SELECT MIN(id) FROM {table_name}
+            WHERE id > :high_water AND created_at > NOW() - INTERVAL :settle SECOND
+        ), ~0)"""
+    return None
+
+
+def _table_columns(local_connection, table_name):
+    inspector = inspect(local_connection)
+    return _watermark_column(inspector, table_name), {col['name'] for col in inspector.get_columns(table_name)}
+
+
+def _settled_high_water(local_connection, table_name, watermark_column, columns, settle=SETTLE_SECONDS):
+    # Mark for a table just copied in full: the newest row that has settled. Newer rows are
+    # re-read (and upserted) by the next incremental run.
+    condition = _settled(table_name, watermark_column, columns)
+    where = f" WHERE {condition}" if condition else ""
+    return local_connection.execute(text(f"SELECT MAX({watermark_column}) FROM {table_name}{where}"),
+                                    {'high_water': -1, 'settle': settle}).scalar()
+
+
+def load_clone_state():
+    local_conn = DBConnectionLocal().create_db_connection()
+
+    with local_conn.connect() as local_connection:
+        with local_connection.begin():
+            local_connection.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+                    table_name VARCHAR(64) PRIMARY KEY,
+                    watermark_column VARCHAR(64),
+                    high_water VARCHAR(64),
+                    schema_hash CHAR(64) NOT NULL,
+                    synced_at DATETIME NOT NULL
+                )
+            """))
+        rows = local_connection.execute(text(f"SELECT * FROM {STATE_TABLE}")).mappings().all()
+    return {row['table_name']: dict(row) for row in rows}
+
+
+def save_clone_state(table_name, watermark_column, high_water, schema_hash):
+    local_conn = DBConnectionLocal().create_db_connection()
+
+    with local_conn.connect() as local_connection:
+        with local_connection.begin():
+            local_connection.execute(text(f"""
+                INSERT INTO {STATE_TABLE} (table_name, watermark_column, high_water, schema_hash, synced_at)
+                VALUES (:table_name, :watermark_column, :high_water, :schema_hash, NOW())
+                ON DUPLICATE KEY UPDATE
+                    watermark_column = VALUES(watermark_column),
+                    high_water = VALUES(high_water),
+                    schema_hash = VALUES(schema_hash),
+                    synced_at = VALUES(synced_at)
+            """), {
+                'table_name': table_name,
+                'watermark_column': watermark_column,
+                'high_water': None if high_water is None else str(high_water),
+                'schema_hash': schema_hash,
+            })
+
+
+def clone_table_tracked(table_name, schema_hash, chunk_size=CHUNK_SIZE, settle=SETTLE_SECONDS):
+    # Full copy that also records where the next incremental run should start
+    try:
+        print(f"Cloning data for table {table_name}...")
+        inserted, _, complete = _stream_copy(table_name, f"SELECT * FROM {table_name}", chunk_size=chunk_size)
+
+        local_conn = DBConnectionLocal().create_db_connection()
+        with local_conn.connect() as local_connection:
+            watermark_column, columns = _table_columns(local_connection, table_name)
+            high_water = None
+            # With rows missing, leave no mark so the next run copies the table in full again
+            if watermark_column and complete:
+                high_water = _settled_high_water(local_connection, table_name, watermark_column, columns, settle)
+        save_clone_state(table_name, watermark_column, high_water, schema_hash)
+        return inserted
+
+    except SQLAlchemyError as e:
+        print(f"Error during data cloning for {table_name}: {str(e)}")
+    finally:
+        print("Data cloning completed.")
+
+
+def clone_table_delta(table_name, state, chunk_size=CHUNK_SIZE, settle=SETTLE_SECONDS):
+    try:
+        local_conn = DBConnectionLocal().create_db_connection()
+        with local_conn.connect() as local_connection:
+            watermark_column, columns = _table_columns(local_connection, table_name)
+    except SQLAlchemyError as e:
+        print(f"Error reading columns of {table_name}: {str(e)}")
+        return None
+
+    # A mark kept on another column (e.g. id, before updated_at was preferred) can't be reused
+    high_water = state['high_water'] if state['watermark_column'] == watermark_column else None
+    if not watermark_column or high_water is None:
+        # Nothing to track progress by: copy everything again, upserting over existing rows
+        select_query = f"SELECT * FROM {table_name}"
+        params = {}
+    else:
+        # Ids are unique so strictly greater is enough; timestamps can tie, so re-read the boundary and upsert.
+        # Rows too new to have settled are left for the next run.
+        operator = '>' if watermark_column == 'id' else '>='
+        condition = _settled(table_name, watermark_column, columns)
+        if condition is None:
+            print(f"{table_name} has no created_at; rows committed out of id order may be missed.")
+        settled = f" AND {condition}" if condition else ""
+        select_query = (f"SELECT * FROM {table_name} WHERE {watermark_column} {operator} :high_water{settled} "
+                        f"ORDER BY {watermark_column}")
+        params = {'high_water': high_water, 'settle': settle}
+
+    try:
+        print(f"Syncing new rows for table {table_name} past {watermark_column} = {high_water}...")
+        inserted, last_row, complete = _stream_copy(table_name, select_query, params, chunk_size=chunk_size,
+                                                    upsert=True)
+        if watermark_column and high_water is None:
+            if not complete:
+                return inserted
+            with local_conn.connect() as local_connection:
+                new_mark = _settled_high_water(local_connection, table_name, watermark_column, columns, settle)
+            save_clone_state(table_name, watermark_column, new_mark, state['schema_hash'])
+        elif last_row is not None and watermark_column:
+            save_clone_state(table_name, watermark_column, last_row[watermark_column], state['schema_hash'])
+        return inserted
+
+    except SQLAlchemyError as e:
+        print(f"Error during incremental cloning: {str(e)}")
+    finally:
+        print("Incremental cloning completed.")
+
+
 
 
 def verify_data(table_name):
@@ -115,6 +346,97 @@ def verify_data(table_name):
         print("Data verification completed.")
         
 
+def table_dependencies(tables):
+    # Map each table to the tables it references through foreign keys (within the clone set)
+    online_conn = DBConnectionOnline().create_db_connection()
+    inspector = inspect(online_conn)
+    wanted = set(tables)
+
+    dependencies = {}
+    for table in tables:
+        referred = {fk['referred_table'] for fk in inspector.get_foreign_keys(table)}
+        dependencies[table] = (referred & wanted) - {table}
+    return dependencies
+
+
+def creation_order(tables):
+    try:
+        # Parents come before the tables that reference them
+        return list(TopologicalSorter(table_dependencies(tables)).static_order())
+    except CycleError as e:
+        print(f"Circular foreign keys between {e.args[1]}, keeping the listed order.")
+        return list(tables)
+    except SQLAlchemyError as e:
+        print(f"Error reading foreign keys, keeping the listed order: {str(e)}")
+        return list(tables)
+
+
+def drop_local_tables(tables):
+    local_conn = DBConnectionLocal().create_db_connection()
+
+    with local_conn.connect() as local_connection:
+        # Tables outside this run may still reference the ones being rebuilt
+        local_connection.execute(text("SET FOREIGN_KEY_CHECKS=0"))
+        for table_name in tables:
+            try:
+                local_connection.execute(text(f"DROP TABLE IF EXISTS {table_name}"))
+            except SQLAlchemyError as e:
+                print(f"Error dropping table {table_name}: {str(e)}")
+        local_connection.execute(text("SET FOREIGN_KEY_CHECKS=1"))
+
+
+def clone_tables(tables, max_workers=MAX_WORKERS, incremental=False):
+    order = creation_order(tables)
+    print(f"Cloning order: {', '.join(order)}")
+
+    if incremental:
+        # Only tables whose online definition changed (or that were never cloned) are rebuilt
+        state = load_clone_state()
+        schema_hashes = online_schema_hashes(order)
+        rebuild = [table for table in order
+                   if table not in state or state[table]['schema_hash'] != schema_hashes[table]]
+    else:
+        rebuild = order
+
+    # Step 1: Rebuild structures sequentially; children are dropped first, parents created first
+    drop_local_tables(reversed(rebuild))
+    cloned_structures = [table for table in rebuild if clone_table_structure(table)]
+    failed = [table for table in rebuild if table not in cloned_structures]
+
+    # Step 2: Copy data in parallel so large log tables don't hold up the small lookup tables
+    copied = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for table in order:
+            if table in failed:
+                continue
+            if not incremental:
+                future = executor.submit(clone_table_data, table)
+            elif table in rebuild:
+                future = executor.submit(clone_table_tracked, table, schema_hashes[table])
+            else:
+                future = executor.submit(clone_table_delta, table, state[table])
+            futures[future] = table
+
+        for future in as_completed(futures):
+            table = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                print(f"Error cloning data for table {table}: {str(e)}")
+                rows = None
+
+            if rows is None:
+                failed.append(table)
+            else:
+                copied[table] = rows
+
+    print(f"Cloned {len(copied)}/{len(order)} tables.")
+    if failed:
+        print(f"Failed tables: {', '.join(failed)}")
+    return copied, failed
+
+
 if __name__ == "__main__":
     
     
@@ -125,17 +447,14 @@ if __name__ == "__main__":
             'category_view_logs',  'buy_logs'
         ]
     
-    for table in tables_to_clone:
-    
-        # Step 1: Clone the structure of the users table
-        clone_table_structure(table)
-
-        # Step 2: Close the connection (handled automatically in the functions)
-        print("Connection closed after structure cloning. \n")
+    parser = argparse.ArgumentParser(description="Clone the online database into the local one.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="copy only rows past each table's high-water mark and rebuild changed structures")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="tables copied in parallel")
+    args = parser.parse_args()
 
-        # Step 3: Clone the data after reopening connections
-        clone_table_data(table)
-        print('\n\n')
+    # Structures in foreign key order, then data copied across a bounded worker pool
+    clone_tables(tables_to_clone, max_workers=args.workers, incremental=args.incremental)
 
-    # Step 4: Verify that data was inserted into the local database
+    # Verify that data was inserted into the local database
     #verify_data('vendors')
@@ -0,0 +1,99 @@
+import queue
+import threading
+
+import pandas as pd
+from sqlalchemy import text
+
+# Rows fetched from the MySQL server-side cursor per batch
+DEFAULT_CHUNK_SIZE = 10000
+
+# Batches buffered ahead of the loader; bounds memory while letting extraction run ahead
+PREFETCH_DEPTH = 2
+
+# Seconds a producer waits on a full buffer before checking whether the consumer is still there
+PUT_TIMEOUT = 0.5
+
+_DONE = object()
+
+
+def stream_frames(engine, query, chunksize=DEFAULT_CHUNK_SIZE, params=None):
+    # stream_results makes pymysql use an unbuffered server-side cursor, so only
+    # one chunk of the result set is ever held on the client
+    with engine.connect().execution_options(stream_results=True) as connection:
+        # Plain SQL strings are wrapped here; prepared text() clauses (e.g. with expanding IN params) pass through
+        statement = text(query) if isinstance(query, str) else query
+        yield from pd.read_sql(statement, connection, params=params, chunksize=chunksize)
+
+
+def stream_query(engine, query, chunksize=DEFAULT_CHUNK_SIZE, params=None):
+    for chunk in stream_frames(engine, query, chunksize=chunksize, params=params):
+        yield chunk.to_dict(orient='records')
+
+
+def _put(buffer, item, stop):
+    # Blocking put that gives up once the consumer has gone away
+    while not stop.is_set():
+        try:
+            buffer.put(item, timeout=PUT_TIMEOUT)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _produce(batches, buffer, stop):
+    # The producer thread is the only one that advances the source, so it is also the one that closes it
+    try:
+        for batch in batches:
+            if not _put(buffer, batch, stop):
+                return
+    except Exception as e:
+        _put(buffer, e, stop)
+    finally:
+        # Closing a stream_query generator hands its streaming MySQL connection back to the pool,
+        # even when the consumer stopped early (e.g. load_batches with stop_on_error)
+        close = getattr(batches, 'close', None)
+        if close is not None:
+            close()
+        _put(buffer, _DONE, stop)
+
+
+def prefetch(batches, depth=PREFETCH_DEPTH):
+    # Pull batches on a background thread so the next MySQL fetch overlaps the current Neo4j write
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    threading.Thread(target=_produce, args=(batches, buffer, stop), daemon=True).start()
+
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Runs when the consumer finishes, raises or drops this generator; the producer then stops
+        stop.set()
+
+
+def merge_streams(streams, depth=PREFETCH_DEPTH):
+    # Run several batch iterators at once, one thread (and so one pooled connection) each,
+    # yielding batches in whatever order they arrive
+    buffer = queue.Queue(maxsize=depth * len(streams))
+    stop = threading.Event()
+    for batches in streams:
+        threading.Thread(target=_produce, args=(batches, buffer, stop), daemon=True).start()
+
+    try:
+        running = len(streams)
+        while running:
+            item = buffer.get()
+            if item is _DONE:
+                running -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        stop.set()
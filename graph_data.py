@@ -0,0 +1,93 @@
+import networkx as nx
+
+# Rows fetched per round trip
+PAGE_SIZE = 5000
+
+# Edges a visualisation pulls in total; roughly what graph_render can still draw interactively
+MAX_EDGES = 100000
+
+# Products the top_degree mode samples
+TOP_K = 50
+
+# Every query returns one row per (user, action, product) with the parallel edges already
+# summed into ``count``, and only scalar ids - never whole nodes or relationships.
+EDGE_COLUMNS = """u.user_id AS user, type(r) AS type, p.product_id AS product,
+       sum(coalesce(r.count, 1)) AS count"""
+
+MODES = {
+    # Whole graph, paged by user id (keyset paging: each page starts where the last one ended)
+    'all': f"""
+        MATCH (u:User)
+        WHERE u.user_id > $after AND (u)-[:VIEWED|BOUGHT|SEARCHED]->(:Product)
+        WITH u ORDER BY u.user_id LIMIT $page_size
+        MATCH (u)-[r:VIEWED|BOUGHT|SEARCHED]->(p:Product)
+        RETURN {EDGE_COLUMNS}
+    """,
+    # Interactions with the top_k products by degree (p.degree is maintained at ingest)
+    'top_degree': f"""
+        MATCH (p:Product) WHERE p.degree IS NOT NULL
+        WITH p ORDER BY p.degree DESC LIMIT $top_k
+        MATCH (u:User)-[r:VIEWED|BOUGHT|SEARCHED]->(p)
+        WITH {EDGE_COLUMNS}
+        RETURN user, type, product, count
+        ORDER BY count DESC, user, product, type
+        SKIP $skip LIMIT $page_size
+    """,
+    # Ego network of one vendor: everyone who interacted with its products
+    'ego': f"""
+        MATCH (:Vendor {{vendor_id: $vendor_id}})-[:OWNS]->(p:Product)<-[r:VIEWED|BOUGHT|SEARCHED]-(u:User)
+        WITH {EDGE_COLUMNS}
+        RETURN user, type, product, count
+        ORDER BY count DESC, user, product, type
+        SKIP $skip LIMIT $page_size
+    """,
+}
+
+
+def iter_pages(graph, mode='all', page_size=PAGE_SIZE, **params):
+    """Yield lists of {user, type, product, count} rows, one page per query."""
+    query = MODES[mode]
+    if mode == 'top_degree':
+        params.setdefault('top_k', TOP_K)
+    # User ids are positive MySQL keys, so -1 is before the first one
+    after, skip = -1, 0
+    while True:
+        page = graph.run(query, after=after, skip=skip, page_size=page_size, **params).data()
+        if not page:
+            return
+        yield page
+        if mode == 'all':
+            after = max(row['user'] for row in page)
+        else:
+            if len(page) < page_size:
+                return
+            skip += page_size
+
+
+def fetch_edges(graph, mode='all', max_edges=MAX_EDGES, page_size=PAGE_SIZE, **params):
+    edges = []
+    for page in iter_pages(graph, mode, page_size=min(page_size, max_edges), **params):
+        edges.extend(page[:max_edges - len(edges)])
+        if len(edges) >= max_edges:
+            break
+    print(f"Fetched {len(edges)} aggregated edges ({mode}).")
+    return edges
+
+
+def edges_to_graph(edges):
+    # Users and products get separate keys so equal ids don't collapse into one node;
+    # the actions between a pair are joined into one edge label
+    G = nx.Graph()
+    for row in edges:
+        user, product = ('User', row['user']), ('Product', row['product'])
+        G.add_node(user, label='User', name=row['user'])
+        G.add_node(product, label='Product', name=row['product'])
+        label = f"{row['type']} x{row['count']}"
+        if G.has_edge(user, product):
+            label = f"{G.edges[user, product]['label']}, {label}"
+        G.add_edge(user, product, label=label)
+    return G
+
+
+def fetch_graph(graph, mode='all', max_edges=MAX_EDGES, **params):
+    return edges_to_graph(fetch_edges(graph, mode, max_edges=max_edges, **params))
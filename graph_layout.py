@@ -0,0 +1,236 @@
+import glob
+import hashlib
+import os
+
+import networkx as nx
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+from scipy.sparse.linalg import eigsh
+
+# Up to this many nodes networkx's exact spring layout is fast enough; above it the
+# spectral + grid-approximated force layout below takes over
+SPRING_LAYOUT_MAX_NODES = 2000
+
+# Components up to this size are placed on a circle instead of solving an eigenproblem
+SPECTRAL_MIN_NODES = 10
+
+# Components up to this size use a dense eigensolver; larger ones sparse eigsh
+DENSE_EIGEN_MAX_NODES = 200
+
+FORCE_ITERATIONS = 50
+INCREMENTAL_ITERATIONS = 15
+
+# Repulsion is computed against the centroids of a GRID_CELLS x GRID_CELLS grid (one level of
+# Barnes-Hut), so each iteration costs O(nodes x cells) instead of O(nodes^2)
+GRID_CELLS = 16
+
+# Nodes whose repulsion is evaluated at once; bounds the nodes x cells temporary
+REPULSION_CHUNK = 4096
+
+LAYOUT_CACHE_DIR = '.layout_cache'
+
+# Cached layouts kept per name; older ones are removed
+LAYOUT_CACHE_KEEP = 5
+
+# Above this share of added/removed nodes a layout is recomputed instead of patched
+INCREMENTAL_MAX_CHANGE = 0.2
+
+
+def graph_fingerprint(keys, edges):
+    # Order-independent digest of the node keys and (undirected) edges
+    digest = hashlib.sha1()
+    for key in sorted(keys):
+        digest.update(key.encode())
+        digest.update(b'\0')
+    for a, b in sorted(tuple(sorted(edge)) for edge in edges):
+        digest.update(f"{a}\0{b}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def adjacency_matrix(n, edges):
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    data = np.ones(len(edges))
+    adjacency = sparse.coo_matrix((data, (edges[:, 0], edges[:, 1])), shape=(n, n))
+    adjacency = ((adjacency + adjacency.T) > 0).astype(float).tocsr()
+    adjacency.setdiag(0)
+    adjacency.eliminate_zeros()
+    return adjacency
+
+
+def _normalise(positions):
+    # Centre on the origin and scale into [-1, 1], as nx.spring_layout does
+    positions = positions - positions.mean(axis=0)
+    scale = np.abs(positions).max()
+    return positions / scale if scale > 0 else positions
+
+
+def _component_layout(adjacency):
+    n = adjacency.shape[0]
+    if n == 1:
+        return np.zeros((1, 2))
+    if n <= SPECTRAL_MIN_NODES:
+        angles = 2 * np.pi * np.arange(n) / n
+        return np.column_stack([np.cos(angles), np.sin(angles)])
+
+    laplacian = csgraph.laplacian(adjacency, normed=True)
+    if n <= DENSE_EIGEN_MAX_NODES:
+        _, vectors = np.linalg.eigh(laplacian.toarray())
+        coordinates = vectors[:, 1:3]
+    else:
+        # The smallest eigenvectors of L are the largest of 2I - L, which Lanczos finds quickly
+        shifted = sparse.identity(n, format='csr') * 2 - laplacian
+        values, vectors = eigsh(shifted, k=3, which='LA', v0=np.ones(n))
+        coordinates = vectors[:, np.argsort(-values)[1:3]]
+
+    # Undo the degree normalisation so hubs don't get pulled to the middle
+    degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    return _normalise(coordinates / np.sqrt(np.maximum(degree, 1))[:, None])
+
+
+def spectral_layout(adjacency):
+    # Lay out each connected component on its own, then shelf-pack them largest first,
+    # each in a square whose side grows with the square root of its size
+    n = adjacency.shape[0]
+    positions = np.zeros((n, 2))
+    _, labels = csgraph.connected_components(adjacency, directed=False)
+    order = np.argsort(labels, kind='stable')
+    bounds = np.searchsorted(labels[order], np.arange(labels.max() + 2))
+    sizes = np.diff(bounds)
+
+    row_width = np.sqrt(n) * 2
+    x = y = row_height = 0.0
+    for component in np.argsort(-sizes, kind='stable'):
+        members = order[bounds[component]:bounds[component + 1]]
+        side = np.sqrt(len(members))
+        if x > 0 and x + side > row_width:
+            x, y, row_height = 0.0, y + row_height, 0.0
+        layout = _component_layout(adjacency[members][:, members])
+        positions[members] = (layout + 1) / 2 * side * 0.9 + [x, y]
+        x += side
+        row_height = max(row_height, side)
+    return _normalise(positions)
+
+
+def _grid_repulsion(positions, k, cells=GRID_CELLS):
+    low = positions.min(axis=0)
+    span = positions.max(axis=0) - low + 1e-9
+    cell = np.minimum(((positions - low) / span * cells).astype(np.int64), cells - 1)
+    cell_index = cell[:, 0] * cells + cell[:, 1]
+
+    mass = np.bincount(cell_index, minlength=cells * cells)
+    occupied = np.flatnonzero(mass)
+    centroids = np.column_stack([
+        np.bincount(cell_index, weights=positions[:, axis], minlength=cells * cells)[occupied]
+        for axis in (0, 1)
+    ]) / mass[occupied][:, None]
+    mass = mass[occupied]
+
+    # Fruchterman-Reingold repulsion k^2 / d from each cell's centroid, weighted by its node count.
+    # A node's own cell pushes it away from the cell centre, which spreads out crowded cells.
+    force = np.empty_like(positions)
+    for start in range(0, len(positions), REPULSION_CHUNK):
+        delta = positions[start:start + REPULSION_CHUNK, None, :] - centroids[None, :, :]
+        distance_sq = (delta ** 2).sum(axis=2) + (0.01 * k) ** 2
+        force[start:start + REPULSION_CHUNK] = k * k * (delta * (mass / distance_sq)[:, :, None]).sum(axis=1)
+    return force
+
+
+def force_layout(adjacency, positions, iterations=FORCE_ITERATIONS, fixed=None, temperature=0.1):
+    """Refine ``positions`` with vectorised Fruchterman-Reingold steps; ``fixed`` nodes don't move."""
+    n = len(positions)
+    positions = positions.copy()
+    rows, cols = sparse.triu(adjacency, k=1).nonzero()
+    k = 2.0 / np.sqrt(n)  # ideal edge length for n nodes in the [-1, 1] square
+
+    for step in range(iterations):
+        # Attraction d^2 / k along each edge, summed per endpoint with bincount
+        delta = positions[rows] - positions[cols]
+        pull = delta * (np.linalg.norm(delta, axis=1) / k)[:, None]
+        displacement = _grid_repulsion(positions, k)
+        for axis in (0, 1):
+            displacement[:, axis] += (np.bincount(cols, weights=pull[:, axis], minlength=n)
+                                      - np.bincount(rows, weights=pull[:, axis], minlength=n))
+
+        # Cap each move at the current temperature, which cools linearly to zero
+        length = np.linalg.norm(displacement, axis=1) + 1e-9
+        limit = temperature * (1 - step / iterations)
+        move = displacement * (np.minimum(length, limit) / length)[:, None]
+        if fixed is not None:
+            move[fixed] = 0
+        positions += move
+    return positions
+
+
+def compute_layout(G, nodes, adjacency, seed=42):
+    if len(nodes) <= SPRING_LAYOUT_MAX_NODES:
+        pos = nx.spring_layout(G, seed=seed)
+        return np.array([pos[node] for node in nodes]).reshape(-1, 2)
+    return _normalise(force_layout(adjacency, spectral_layout(adjacency)))
+
+
+def update_layout(adjacency, positions, known, seed=42):
+    # New nodes start at the mean of their placed neighbours (spreading out over a few rounds),
+    # the rest near the centre; then only they are relaxed while the old nodes stay put
+    rng = np.random.default_rng(seed)
+    positions = positions.copy()
+    placed = known.copy()
+    for _ in range(3):
+        neighbours = adjacency[:, placed]
+        counts = np.asarray(neighbours.sum(axis=1)).ravel()
+        ready = ~placed & (counts > 0)
+        if not ready.any():
+            break
+        positions[ready] = (neighbours[ready] @ positions[placed]) / counts[ready][:, None]
+        positions[ready] += rng.normal(scale=0.02, size=(ready.sum(), 2))
+        placed |= ready
+    positions[~placed] = rng.normal(scale=0.1, size=((~placed).sum(), 2))
+    return force_layout(adjacency, positions, iterations=INCREMENTAL_ITERATIONS, fixed=known, temperature=0.05)
+
+
+def _cached_layouts(cache_dir, name):
+    return sorted(glob.glob(os.path.join(cache_dir, f'{name}-*.npz')), key=os.path.getmtime, reverse=True)
+
+
+def cached_layout(G, name='graph', cache_dir=LAYOUT_CACHE_DIR, seed=42):
+    """Node -> (x, y) positions for ``G``, like ``nx.spring_layout``, cached on disk.
+
+    Layouts are stored per graph fingerprint. A graph seen before loads instantly; one that
+    differs from the last cached layout in only a few nodes is patched rather than recomputed.
+    """
+    nodes = list(G.nodes())
+    if not nodes:
+        return {}
+    keys = [str(node) for node in nodes]
+    index = {node: position for position, node in enumerate(nodes)}
+    edges = [(index[a], index[b]) for a, b in G.edges()]
+    fingerprint = graph_fingerprint(keys, [(keys[a], keys[b]) for a, b in edges])
+    path = os.path.join(cache_dir, f'{name}-{fingerprint}.npz')
+
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            stored = dict(zip(cached['keys'], cached['positions']))
+        print(f"Loaded cached layout {path}")
+        return {node: stored[key] for node, key in zip(nodes, keys)}
+
+    adjacency = adjacency_matrix(len(nodes), edges)
+    positions = None
+    previous = _cached_layouts(cache_dir, name)
+    if previous:
+        with np.load(previous[0]) as cached:
+            stored = dict(zip(cached['keys'], cached['positions']))
+        known = np.array([key in stored for key in keys])
+        changed = (len(keys) - known.sum()) + (len(stored) - known.sum())
+        if known.any() and changed <= INCREMENTAL_MAX_CHANGE * max(len(keys), len(stored)):
+            start = np.array([stored.get(key, (0.0, 0.0)) for key in keys], dtype=float)
+            positions = update_layout(adjacency, start, known, seed=seed)
+            print(f"Updated cached layout for {changed} changed nodes")
+    if positions is None:
+        positions = compute_layout(G, nodes, adjacency, seed=seed)
+        print(f"Computed layout for {len(nodes)} nodes")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez_compressed(path, keys=np.array(keys), positions=positions)
+    for stale in _cached_layouts(cache_dir, name)[LAYOUT_CACHE_KEEP:]:
+        os.remove(stale)
+    return {node: positions[position] for position, node in enumerate(nodes)}
@@ -0,0 +1,83 @@
+import numpy as np
+import plotly.graph_objs as go
+
+# Above this many nodes traces are drawn with WebGL (Scattergl) instead of SVG,
+# and node ids move from always-on text to hover text
+WEBGL_NODE_THRESHOLD = 1000
+
+
+def edge_coordinates(xy, edges):
+    # x0, x1, NaN per edge in one array; the NaN breaks the line between consecutive edges
+    gap = np.full(len(edges), np.nan)
+    start, end = xy[edges[:, 0]], xy[edges[:, 1]]
+    return (np.column_stack([start[:, 0], end[:, 0], gap]).ravel(),
+            np.column_stack([start[:, 1], end[:, 1], gap]).ravel())
+
+
+def graph_traces(G, pos, edge_width=0.5, webgl=None):
+    """Edge, edge-label and node traces for a networkx graph laid out in ``pos``.
+
+    Coordinates are gathered into NumPy arrays once. Edge labels are the hover text of a
+    single invisible marker trace at the edge midpoints rather than one annotation per edge.
+    """
+    nodes = list(G.nodes())
+    index = {node: position for position, node in enumerate(nodes)}
+    xy = np.array([pos[node] for node in nodes], dtype=float).reshape(-1, 2)
+    edge_data = list(G.edges(data='label'))
+    edges = np.array([(index[a], index[b]) for a, b, _ in edge_data], dtype=np.int64).reshape(-1, 2)
+
+    if webgl is None:
+        webgl = len(nodes) > WEBGL_NODE_THRESHOLD
+    scatter = go.Scattergl if webgl else go.Scatter
+
+    edge_x, edge_y = edge_coordinates(xy, edges)
+    edge_trace = scatter(
+        x=edge_x, y=edge_y,
+        line=dict(width=edge_width, color='gray'),
+        hoverinfo='none',
+        mode='lines')
+
+    midpoints = (xy[edges[:, 0]] + xy[edges[:, 1]]) / 2
+    edge_label_trace = scatter(
+        x=midpoints[:, 0], y=midpoints[:, 1],
+        mode='markers',
+        marker=dict(size=6, opacity=0),
+        hovertext=[label for _, _, label in edge_data],
+        hoverinfo='text')
+
+    attributes = [G.nodes[node] for node in nodes]
+    labels = [f"{attrs['label']}: {attrs.get('name', node)}" if 'label' in attrs else str(node)
+              for node, attrs in zip(nodes, attributes)]
+    # Degree per node, straight from the edge index array
+    degree = np.bincount(edges.ravel(), minlength=len(nodes))
+    node_trace = scatter(
+        x=xy[:, 0], y=xy[:, 1],
+        mode='markers' if webgl else 'markers+text',
+        text=None if webgl else labels,
+        hovertext=labels,
+        textposition="top center",
+        hoverinfo='text',
+        marker=dict(
+            showscale=True,
+            colorscale='YlGnBu',
+            size=10,
+            color=degree,
+            line_width=2))
+
+    return [edge_trace, edge_label_trace, node_trace]
+
+
+def graph_figure(G, pos, title='User-Product Interaction Graph', caption=None, edge_width=0.5, webgl=None):
+    annotations = []
+    if caption:
+        annotations.append(dict(text=caption, showarrow=False, xref="paper", yref="paper", x=0.005, y=-0.002))
+    return go.Figure(data=graph_traces(G, pos, edge_width=edge_width, webgl=webgl),
+                     layout=go.Layout(
+                         title=title,
+                         titlefont_size=16,
+                         showlegend=False,
+                         hovermode='closest',
+                         margin=dict(b=0, l=0, r=0, t=40),
+                         annotations=annotations,
+                         xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+                         yaxis=dict(showgrid=False, zeroline=False, showticklabels=False)))
@@ -0,0 +1,291 @@
+import datetime
+import itertools
+import time
+
+from schema import ensure_schema
+
+# Rows written per Neo4j transaction. Large enough to amortise the Bolt round
+# trip, small enough to keep the transaction state on the server bounded.
+DEFAULT_BATCH_SIZE = 10000
+
+# Relationship type used for each action_type coming out of MySQL
+ACTION_RELATIONSHIPS = {
+    'view': 'VIEWED',
+    'search': 'SEARCHED',
+    'buy': 'BOUGHT',
+}
+
+
+def action_statements(relationships, rel_clause):
+    # Cypher can't parameterise relationship types, so emit one statement per action
+    statements = []
+    for action_type, rel_type in relationships.items():
+        statements.append(f"""
+            UNWIND $rows AS row
+            WITH row WHERE row.action_type = '{action_type}'
+                AND row.user_id IS NOT NULL AND row.product_id IS NOT NULL
+            MATCH (u:User {{user_id: row.user_id}})
+            MATCH (p:Product {{product_id: row.product_id}})
+            {rel_clause.format(rel_type=rel_type)}
+        """)
+    return statements
+
+
+# Interaction edges on a product. run_4.py caps and IDF-weights traversals through popular
+# products by this, so it is refreshed for every product a batch touched, after its edges land.
+# No label on the far end: only users create these edges, and without one the count is read
+# from the node's degree store instead of expanding every relationship of a hot product.
+DEGREE_EXPRESSION = "COUNT { (p)<-[:VIEWED|BOUGHT|SEARCHED]-() }"
+
+DEGREE_STATEMENT = f"""
+    UNWIND $rows AS row
+    WITH DISTINCT row.product_id AS product_id WHERE product_id IS NOT NULL
+    MATCH (p:Product {{product_id: product_id}})
+    SET p.degree = {DEGREE_EXPRESSION}
+"""
+
+
+# Widen an edge's first_seen/last_seen to cover a batch of raw events. min/max fold, so
+# reloading the same rows leaves the edge unchanged.
+SEEN_CLAUSE = """WITH u, p, min(localdatetime(row.created_at)) AS first_seen,
+                max(localdatetime(row.created_at)) AS last_seen
+            MERGE (u)-[r:{rel_type}]->(p)
+            SET r.first_seen = CASE WHEN r.first_seen IS NULL OR first_seen < r.first_seen
+                                    THEN first_seen ELSE r.first_seen END,
+                r.last_seen = CASE WHEN r.last_seen IS NULL OR last_seen > r.last_seen
+                                   THEN last_seen ELSE r.last_seen END"""
+
+# One edge per event: count 1, and first_seen = last_seen = the event time, so per-event and
+# aggregated graphs share the properties run_4.py reads
+EVENT_CLAUSE = """CREATE (u)-[:{rel_type} {{count: 1, first_seen: localdatetime(row.created_at),
+                last_seen: localdatetime(row.created_at)}}]->(p)"""
+
+# User / Product / Category graph built by run_2.py, run_3.py and run_3a.py
+CATEGORY_ACTION_STATEMENTS = [
+    """
+    UNWIND $rows AS row
+    WITH row WHERE row.user_id IS NOT NULL
+    MERGE (:User {user_id: row.user_id})
+    """,
+    """
+    UNWIND $rows AS row
+    WITH row WHERE row.product_id IS NOT NULL
+    MERGE (p:Product {product_id: row.product_id})
+    WITH p, row WHERE row.category_id IS NOT NULL
+    MERGE (c:Category {category_id: row.category_id})
+    MERGE (p)-[:BELONGS_TO]->(c)
+    """,
+] + action_statements(ACTION_RELATIONSHIPS, SEEN_CLAUSE) + [DEGREE_STATEMENT]
+
+
+# Vendor ownership for rows tagged with vendor_id (multi-vendor run_3/run_3a loads and sync.py)
+VENDOR_OWNS_STATEMENT = """
+    UNWIND $rows AS row
+    WITH row WHERE row.product_id IS NOT NULL AND row.vendor_id IS NOT NULL
+    MERGE (v:Vendor {vendor_id: row.vendor_id})
+    WITH v, row
+    MATCH (p:Product {product_id: row.product_id})
+    MERGE (v)-[:OWNS]->(p)
+"""
+
+CATEGORY_VENDOR_STATEMENTS = CATEGORY_ACTION_STATEMENTS + [VENDOR_OWNS_STATEMENT]
+
+
+# Dimension tables for run_5.py, each bulk-loaded once before any interaction is streamed.
+# In load order: products attach to categories and vendors that must already exist.
+VENDOR_DIMENSION_STATEMENTS = {
+    'users': [
+        """
+        UNWIND $rows AS row
+        MERGE (u:User {user_id: row.user_id})
+        SET u.user_name = row.user_name
+        """,
+    ],
+    'vendors': [
+        """
+        UNWIND $rows AS row
+        MERGE (v:Vendor {vendor_id: row.vendor_id})
+        SET v.vendor_name = row.vendor_name
+        """,
+    ],
+    'categories': [
+        """
+        UNWIND $rows AS row
+        MERGE (c:Category {category_id: row.category_id})
+        SET c.category_name = row.category_name
+        """,
+    ],
+    'products': [
+        """
+        UNWIND $rows AS row
+        MERGE (p:Product {product_id: row.product_id})
+        SET p.product_name = row.product_name
+        WITH p, row
+        MATCH (c:Category {category_id: row.category_id})
+        MERGE (p)-[:BELONGS_TO]->(c)
+        WITH p, row
+        MATCH (v:Vendor {vendor_id: row.vendor_id})
+        MERGE (v)-[:OWNS]->(p)
+        """,
+    ],
+}
+
+INTERACTED_WITH_STATEMENT = """
+    UNWIND $rows AS row
+    WITH row WHERE row.user_id IS NOT NULL AND row.vendor_id IS NOT NULL
+    MATCH (u:User {user_id: row.user_id})
+    MATCH (v:Vendor {vendor_id: row.vendor_id})
+    MERGE (u)-[:INTERACTED_WITH]->(v)
+"""
+
+# Same edge for fact rows that carry only a product; the vendor comes from the OWNS edge
+PRODUCT_INTERACTED_WITH_STATEMENT = """
+    UNWIND $rows AS row
+    WITH DISTINCT row.user_id AS user_id, row.product_id AS product_id
+    WHERE user_id IS NOT NULL AND product_id IS NOT NULL
+    MATCH (u:User {user_id: user_id})
+    MATCH (v:Vendor)-[:OWNS]->(:Product {product_id: product_id})
+    MERGE (u)-[:INTERACTED_WITH]->(v)
+"""
+
+# run_5.py fact rows: (user_id, action_type, product_id) for views and buys, (user_id, action_type,
+# vendor_id) for searches. Names live on the dimension nodes, so rows only MATCH them.
+# One edge per event, as run_5.py originally wrote them
+VENDOR_ACTION_STATEMENTS = action_statements(
+    {'view': ACTION_RELATIONSHIPS['view'], 'buy': ACTION_RELATIONSHIPS['buy']},
+    EVENT_CLAUSE,
+) + [
+    """
+    UNWIND $rows AS row
+    WITH row WHERE row.action_type = 'search' AND row.product_id IS NULL
+        AND row.user_id IS NOT NULL AND row.vendor_id IS NOT NULL
+    MATCH (u:User {user_id: row.user_id})
+    MATCH (v:Vendor {vendor_id: row.vendor_id})
+    CREATE (u)-[:SEARCHED {count: 1, first_seen: localdatetime(row.created_at),
+                           last_seen: localdatetime(row.created_at)}]->(v)
+    """,
+    INTERACTED_WITH_STATEMENT,
+    PRODUCT_INTERACTED_WITH_STATEMENT,
+    DEGREE_STATEMENT,
+]
+
+# Rows already grouped per (user, action, product) with event_count/first_seen/last_seen.
+# SET rather than increment: the totals are absolute, so reloading is idempotent.
+AGGREGATE_CLAUSE = """MERGE (u)-[r:{rel_type}]->(p)
+            SET r.count = row.event_count,
+                r.first_seen = localdatetime(row.first_seen),
+                r.last_seen = localdatetime(row.last_seen)"""
+
+# Fold a batch of raw events into existing weighted edges
+INCREMENT_CLAUSE = """WITH u, p, count(*) AS event_count,
+                min(localdatetime(row.created_at)) AS first_seen,
+                max(localdatetime(row.created_at)) AS last_seen
+            MERGE (u)-[r:{rel_type}]->(p)
+            ON CREATE SET r.count = event_count, r.first_seen = first_seen, r.last_seen = last_seen
+            ON MATCH SET r.count = coalesce(r.count, 1) + event_count,
+                r.first_seen = CASE WHEN r.first_seen IS NULL OR first_seen < r.first_seen
+                                    THEN first_seen ELSE r.first_seen END,
+                r.last_seen = CASE WHEN r.last_seen IS NULL OR last_seen > r.last_seen
+                                   THEN last_seen ELSE r.last_seen END"""
+
+# One weighted edge per (user, action, product) instead of one per event
+AGGREGATED_VENDOR_STATEMENTS = action_statements(
+    {'view': ACTION_RELATIONSHIPS['view'], 'buy': ACTION_RELATIONSHIPS['buy']},
+    AGGREGATE_CLAUSE,
+) + [
+    """
+    UNWIND $rows AS row
+    WITH row WHERE row.action_type = 'search' AND row.product_id IS NULL
+        AND row.user_id IS NOT NULL AND row.vendor_id IS NOT NULL
+    MATCH (u:User {user_id: row.user_id})
+    MATCH (v:Vendor {vendor_id: row.vendor_id})
+    MERGE (u)-[r:SEARCHED]->(v)
+    SET r.count = row.event_count,
+        r.first_seen = localdatetime(row.first_seen),
+        r.last_seen = localdatetime(row.last_seen)
+    """,
+    INTERACTED_WITH_STATEMENT,
+    PRODUCT_INTERACTED_WITH_STATEMENT,
+    DEGREE_STATEMENT,
+]
+
+
+def clean_record(record):
+    # pandas turns SQL NULLs into NaN/NaT and nullable int columns into floats;
+    # Neo4j needs real nulls and ints so MERGE keys line up across batches
+    cleaned = {}
+    for key, value in record.items():
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        elif value is not None and value != value:
+            # NaN and NaT are the only values not equal to themselves
+            value = None
+        elif isinstance(value, datetime.date):
+            # ISO strings go over Bolt without driver-specific temporal types; Cypher parses them back
+            value = value.isoformat()
+        cleaned[key] = value
+    return cleaned
+
+
+def batched(records, batch_size=DEFAULT_BATCH_SIZE):
+    iterator = iter(records)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_batch(graph, batch, statements):
+    # One transaction per batch: either every statement lands or none does
+    tx = graph.begin()
+    try:
+        for statement in statements:
+            tx.run(statement, rows=batch)
+        graph.commit(tx)
+    except Exception:
+        graph.rollback(tx)
+        raise
+
+
+def refresh_degrees(graph, batch_size=DEFAULT_BATCH_SIZE):
+    # Backfill p.degree on a graph loaded before it was maintained; batched so it never holds
+    # every product in one transaction
+    graph.run(f"""
+        MATCH (p:Product)
+        CALL {{
+            WITH p
+            SET p.degree = {DEGREE_EXPRESSION}
+        }} IN TRANSACTIONS OF {int(batch_size)} ROWS
+    """)
+    print("Product degrees refreshed.")
+
+
+def load_in_batches(graph, records, statements, batch_size=DEFAULT_BATCH_SIZE):
+    return load_batches(graph, batched(records, batch_size), statements)
+
+
+def load_batches(graph, batches, statements, stop_on_error=False, on_batch=None):
+    # Without the key constraints every MERGE is a label scan
+    ensure_schema(graph)
+
+    loaded = 0
+    started = time.perf_counter()
+
+    for batch_number, batch in enumerate(batches, start=1):
+        batch = [clean_record(record) for record in batch]
+        try:
+            write_batch(graph, batch, statements)
+            if on_batch is not None:
+                on_batch(batch)
+            loaded += len(batch)
+            elapsed = time.perf_counter() - started
+            print(f"Batch {batch_number}: {len(batch)} rows written "
+                  f"({loaded} total, {loaded / elapsed:.0f} rows/s)")
+        except Exception as e:
+            print(f"Error inserting batch {batch_number}: {e}")
+            if stop_on_error:
+                raise
+
+    print(f"Loaded {loaded} rows in {time.perf_counter() - started:.1f}s.")
+    return loaded
@@ -1,8 +1,7 @@
-from neo4j import GraphDatabase
 from neo4j.exceptions import ServiceUnavailable
+from db_clone.connector.connect import get_driver
 
-uri = "bolt://localhost:7687"
-driver = GraphDatabase.driver(uri, auth=("neo4j", "$Verine123"))
+driver = get_driver()
 
 def test_connection():
     try:
@@ -0,0 +1,163 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+
+# Entries kept before the least recently used one is evicted
+CACHE_MAXSIZE = 10000
+
+# Seconds a cached recommendation is served before it is recomputed
+CACHE_TTL = 300
+
+# Base URLs (comma separated) of the rec_service.py processes to notify when interactions land
+REC_SERVICE_URLS = [url.rstrip('/') for url in os.getenv('REC_SERVICE_URLS', '').split(',') if url]
+
+# Seconds to wait for each service to acknowledge an invalidation
+INVALIDATION_TIMEOUT = 2
+
+
+class RecommendationCache:
+    """LRU cache with a TTL for recommendation results.
+
+    Keys are (function name, scope id, remaining arguments). Each entry is also indexed by its
+    scope ('user' or 'category') so ingest can drop everything it just made stale.
+
+    The cache lives in one process. Loaders reach other processes through broadcast_invalidation;
+    a process that isn't listed in REC_SERVICE_URLS only sees new interactions once the TTL expires.
+    """
+
+    def __init__(self, maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._scopes = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            value, expires_at, scope = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def put(self, key, value, scope=None):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, scope)
+            if scope is not None:
+                self._scopes.setdefault(scope, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def _remove(self, key):
+        _, _, scope = self._entries.pop(key)
+        if scope is not None:
+            keys = self._scopes.get(scope)
+            keys.discard(key)
+            if not keys:
+                del self._scopes[scope]
+
+    def invalidate(self, scope_type, ids):
+        with self._lock:
+            for scope_id in ids:
+                for key in list(self._scopes.get((scope_type, scope_id), ())):
+                    self._remove(key)
+                    self._stats['invalidations'] += 1
+
+    def invalidate_users(self, user_ids):
+        self.invalidate('user', user_ids)
+
+    def invalidate_categories(self, category_ids):
+        self.invalidate('category', category_ids)
+
+    def invalidate_batch(self, batch):
+        # Hook for ingest.load_batches: drop results for every user/category a written batch touched
+        self.invalidate_users({row['user_id'] for row in batch if row.get('user_id') is not None})
+        self.invalidate_categories({row['category_id'] for row in batch if row.get('category_id') is not None})
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def cached(self, scope_type, id_param):
+        """Cache a recommendation function, scoping entries by the value of ``id_param``.
+
+        The ``graph`` argument is left out of the key; every other argument (after defaults
+        are applied) is part of it.
+        """
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                # dict arguments (e.g. signal weights) are keyed by their sorted items
+                arguments = {name: tuple(sorted(value.items())) if isinstance(value, dict) else value
+                             for name, value in bound.arguments.items() if name != 'graph'}
+                key = (func.__name__, arguments[id_param]) + tuple(sorted(arguments.items()))
+
+                value = self.get(key)
+                if value is None:
+                    value = func(*args, **kwargs)
+                    self.put(key, value, scope=(scope_type, arguments[id_param]))
+                # Hand out copies so callers can't modify what later hits will see
+                return value.copy()
+
+            wrapper.cache = self
+            return wrapper
+
+        return decorator
+
+
+# Shared by run_4.py and rec_service.py within a process
+recommendation_cache = RecommendationCache()
+
+
+def broadcast_invalidation(batch=None, urls=REC_SERVICE_URLS):
+    """Drop stale recommendations here and in every rec_service.py process in ``urls``.
+
+    With a batch, only the users and categories it touched are dropped (the sync.py on_batch hook);
+    without one, everything is (after a full load).
+    """
+    if batch is None:
+        recommendation_cache.clear()
+        payload = {'all': True}
+    else:
+        recommendation_cache.invalidate_batch(batch)
+        payload = {'users': sorted({row['user_id'] for row in batch if row.get('user_id') is not None}),
+                   'categories': sorted({row['category_id'] for row in batch if row.get('category_id') is not None})}
+
+    body = json.dumps(payload).encode()
+    for url in urls:
+        request = urllib.request.Request(f"{url}/invalidate", data=body, method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            urllib.request.urlopen(request, timeout=INVALIDATION_TIMEOUT).close()
+        except OSError as e:
+            # The load has committed either way; that service falls back to the TTL
+            print(f"Error invalidating recommendations at {url}: {e}")
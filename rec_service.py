@@ -0,0 +1,194 @@
+import argparse
+import asyncio
+
+from aiohttp import web
+from neo4j import unit_of_work
+from neo4j.exceptions import DriverError, Neo4jError
+
+from db_clone.connector.connect import get_async_driver
+from rec_cache import recommendation_cache
+from run_4 import (DEFAULT_FANOUT, FANOUT, HYBRID_WEIGHTS, RECENTLY_VIEWED_NOT_PURCHASED_QUERY, SIGNAL_CANDIDATES,
+                   SIGNAL_QUERIES, SIMILAR_USERS_QUERY, SIMILARITY_INDEX_QUERY, USERS_FOR_CATEGORY_QUERY,
+                   VIEWED_BY_SIMILAR_USERS_QUERY, combine_signals)
+
+# Neo4j sessions open at once; further requests queue for a session
+MAX_CONCURRENCY = 32
+
+# Requests allowed to wait for a session before new ones are turned away with 503
+MAX_PENDING = 512
+
+# Seconds a request may take end to end, including the wait for a session
+REQUEST_TIMEOUT = 5.0
+
+MAX_LIMIT = 100
+
+# endpoint name -> (query, id parameter, scope for cache invalidation, default limit, extra parameters);
+# a dict of queries is the hybrid recommender: one signal query per action, merged by combine_signals
+ENDPOINTS = {
+    'viewed-by-similar-users': (VIEWED_BY_SIMILAR_USERS_QUERY, 'user_id', 'user', 5, FANOUT[DEFAULT_FANOUT]),
+    'similar-users': (SIMILAR_USERS_QUERY, 'target_user_id', 'user', 5, FANOUT[DEFAULT_FANOUT]),
+    'users-for-category': (USERS_FOR_CATEGORY_QUERY, 'category_id', 'category', 5, {}),
+    'recently-viewed-not-purchased': (RECENTLY_VIEWED_NOT_PURCHASED_QUERY, 'target_user_id', 'user', 5, {}),
+    'similar-products': (SIMILARITY_INDEX_QUERY, 'target_user_id', 'user', 5, {'seeds': 10, 'via': 'VIEWED'}),
+    'products': (SIGNAL_QUERIES, 'user_id', 'user', 10, dict(FANOUT[DEFAULT_FANOUT], candidates=SIGNAL_CANDIDATES)),
+}
+
+
+class Overloaded(Exception):
+    pass
+
+
+class RecommendationService:
+    """Runs the run_4.py queries on the async Neo4j driver.
+
+    Concurrent requests for the same (endpoint, id, limit) share one in-flight query, and
+    results land in the shared recommendation cache so repeats never reach Neo4j.
+    """
+
+    def __init__(self, driver, max_concurrency=MAX_CONCURRENCY, max_pending=MAX_PENDING,
+                 query_timeout=REQUEST_TIMEOUT, cache=recommendation_cache):
+        self.driver = driver
+        self.cache = cache
+        self.max_pending = max_pending
+        self.query_timeout = query_timeout
+        self._sessions = asyncio.Semaphore(max_concurrency)
+        self._inflight = {}
+        self._pending = 0
+        self.coalesced = 0
+
+    async def recommend(self, endpoint, scope_id, limit):
+        query, id_param, scope, _, extra = ENDPOINTS[endpoint]
+        key = ('service', endpoint, scope_id, limit)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        # Look up and register in one step, so two requests can never both miss and both query
+        future = asyncio.get_running_loop().create_future()
+        shared = self._inflight.setdefault(key, future)
+        if shared is not future:
+            self.coalesced += 1
+        else:
+            if self._pending >= self.max_pending:
+                del self._inflight[key]
+                raise Overloaded()
+            # Counted from here, not when the task first runs, so a burst can't overshoot max_pending
+            self._pending += 1
+            params = dict(extra, limit=limit, **{id_param: scope_id})
+            task = asyncio.ensure_future(self._run(query, params, key, (scope, scope_id)))
+            task.add_done_callback(lambda done: self._settle(key, future, done))
+
+        # shield: one caller timing out must not cancel the query the other callers are waiting on
+        return await asyncio.shield(shared)
+
+    def _settle(self, key, future, task):
+        self._pending -= 1
+        self._inflight.pop(key, None)
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    async def _run(self, query, params, key, scope):
+        async with self._sessions:
+            async with self.driver.session() as session:
+                # The transaction timeout stops the query server-side too, not just our wait for it.
+                # Managed transactions take it from unit_of_work; Query objects are session.run only.
+                read = unit_of_work(timeout=self.query_timeout)(self._read)
+                records = await session.execute_read(read, query, params)
+        self.cache.put(key, records, scope=scope)
+        return records
+
+    async def _read(self, tx, query, params):
+        if isinstance(query, dict):
+            signal_params = dict(params, limit=params['candidates'])
+            signals = {action: await self._read(tx, signal_query, signal_params) for action, signal_query in query.items()}
+            return combine_signals(signals, HYBRID_WEIGHTS, params['limit'])
+        result = await tx.run(query, params)
+        return await result.data()
+
+    def stats(self):
+        return {'pending': self._pending, 'inflight': len(self._inflight),
+                'coalesced': self.coalesced, 'cache': self.cache.stats()}
+
+
+async def handle_recommend(request):
+    service = request.app['service']
+    endpoint = request.match_info['endpoint']
+    if endpoint not in ENDPOINTS:
+        raise web.HTTPNotFound(text=f"Unknown endpoint {endpoint}")
+
+    try:
+        scope_id = int(request.match_info['id'])
+        limit = int(request.query.get('limit', ENDPOINTS[endpoint][3]))
+    except ValueError:
+        raise web.HTTPBadRequest(text="id and limit must be integers")
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    try:
+        records = await asyncio.wait_for(service.recommend(endpoint, scope_id, limit), REQUEST_TIMEOUT)
+    except Overloaded:
+        raise web.HTTPServiceUnavailable(text="Too many pending requests", headers={'Retry-After': '1'})
+    except asyncio.TimeoutError:
+        raise web.HTTPGatewayTimeout(text="Recommendation query timed out")
+    except Neo4jError as e:
+        # The server-side transaction timeout set in _read surfaces as a ClientError
+        if e.code and 'TransactionTimedOut' in e.code:
+            raise web.HTTPGatewayTimeout(text="Recommendation query timed out")
+        raise web.HTTPServiceUnavailable(text=f"Neo4j error: {e.code}", headers={'Retry-After': '1'})
+    except DriverError:
+        raise web.HTTPServiceUnavailable(text="Neo4j unavailable", headers={'Retry-After': '1'})
+
+    return web.json_response(records)
+
+
+async def handle_invalidate(request):
+    # Called by sync.py and the loaders (rec_cache.broadcast_invalidation) after writing interactions
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="expected a JSON body")
+    cache = request.app['service'].cache
+    if payload.get('all'):
+        cache.clear()
+    else:
+        cache.invalidate_users(payload.get('users', ()))
+        cache.invalidate_categories(payload.get('categories', ()))
+    return web.json_response(cache.stats())
+
+
+async def handle_stats(request):
+    return web.json_response(request.app['service'].stats())
+
+
+def create_app(max_concurrency=MAX_CONCURRENCY, max_pending=MAX_PENDING):
+    app = web.Application()
+
+    async def open_driver(app):
+        app['driver'] = get_async_driver(pool_size=max_concurrency)
+        app['service'] = RecommendationService(app['driver'], max_concurrency=max_concurrency,
+                                               max_pending=max_pending)
+
+    async def close_driver(app):
+        await app['driver'].close()
+
+    app.on_startup.append(open_driver)
+    app.on_cleanup.append(close_driver)
+    app.router.add_get('/recommendations/{endpoint}/{id}', handle_recommend)
+    app.router.add_get('/stats', handle_stats)
+    app.router.add_post('/invalidate', handle_invalidate)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve run_4.py recommendations over HTTP.")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-concurrency', type=int, default=MAX_CONCURRENCY)
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING)
+    args = parser.parse_args()
+
+    web.run_app(create_app(args.max_concurrency, args.max_pending), host=args.host, port=args.port)
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Interaction edges exported from Neo4j; r.count is 1 for graphs loaded one edge per event
+EXPORT_INTERACTIONS_QUERY = """
+MATCH (u:User)-[r:VIEWED|BOUGHT|SEARCHED]->(p:Product)
+RETURN u.user_id AS user_id, type(r) AS action, p.product_id AS product_id,
+       coalesce(r.count, 1) AS weight, toString(r.last_seen) AS last_seen
+"""
+
+EXPORT_CATEGORIES_QUERY = """
+MATCH (p:Product)-[:BELONGS_TO]->(c:Category)
+RETURN p.product_id AS product_id, c.category_id AS category_id
+"""
+
+ACTIONS = ['VIEWED', 'BOUGHT', 'SEARCHED']
+
+# Weights recommend_products gives each co-interaction signal
+HYBRID_WEIGHTS = {'BOUGHT': 3, 'VIEWED': 2, 'SEARCHED': 1}
+
+
+def top_scores(index_ids, scores, limit):
+    # Highest positive scores first, like ORDER BY ... DESC LIMIT on the Cypher side
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > limit:
+        candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+    candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+    return index_ids[candidates], scores[candidates]
+
+
+class RecommendationEngine:
+    """In-memory copy of the user x product graph answering the run_4.py queries with sparse products.
+
+    For each action type it keeps two CSR matrices: ``edges`` counts relationships between a user
+    and a product (what a Cypher path count sees) and ``weights`` sums their ``r.count``.
+    """
+
+    def __init__(self, interactions, categories=None):
+        self.user_ids, user_codes = self._index(interactions['user_id'])
+        self.product_ids, product_codes = self._index(interactions['product_id'])
+        self.user_index = pd.Index(self.user_ids)
+        self.product_index = pd.Index(self.product_ids)
+        shape = (len(self.user_ids), len(self.product_ids))
+
+        self.edges = {}
+        self.weights = {}
+        for action in ACTIONS:
+            mask = (interactions['action'] == action).to_numpy()
+            rows, cols = user_codes[mask], product_codes[mask]
+            # Duplicate (row, col) entries are summed, which is exactly the parallel-edge count
+            self.edges[action] = sparse.csr_matrix(
+                (np.ones(mask.sum(), dtype=np.int64), (rows, cols)), shape=shape)
+            self.weights[action] = sparse.csr_matrix(
+                (interactions['weight'].to_numpy(dtype=np.int64)[mask], (rows, cols)), shape=shape)
+        # Transposes are what the user -> user hop multiplies against; build them once
+        self.edges_t = {action: matrix.T.tocsr() for action, matrix in self.edges.items()}
+
+        self.all_edges = sum(self.edges.values())
+        self.all_weights = sum(self.weights.values())
+
+        # Products each user viewed, most recent first: users' runs are found with searchsorted
+        views = pd.DataFrame({
+            'user': user_codes,
+            'product': product_codes,
+            'last_seen': pd.to_datetime(interactions['last_seen'], errors='coerce').to_numpy(),
+        })[(interactions['action'] == 'VIEWED').to_numpy()]
+        views = views.groupby(['user', 'product'], as_index=False)['last_seen'].max()
+        views = views.sort_values(['user', 'last_seen'], ascending=[True, False], na_position='last')
+        self.recent_view_users = views['user'].to_numpy()
+        self.recent_view_products = views['product'].to_numpy()
+
+        self.categories = categories if categories is not None else pd.DataFrame(columns=['product_id', 'category_id'])
+
+    @staticmethod
+    def _index(values):
+        codes, uniques = pd.factorize(values)
+        return np.asarray(uniques), codes
+
+    @classmethod
+    def from_graph(cls, graph):
+        interactions = graph.run(EXPORT_INTERACTIONS_QUERY).to_data_frame()
+        if interactions.empty:
+            interactions = pd.DataFrame(columns=['user_id', 'action', 'product_id', 'weight', 'last_seen'])
+        categories = graph.run(EXPORT_CATEGORIES_QUERY).to_data_frame()
+        print(f"Exported {len(interactions)} interaction edges and {len(categories)} category links.")
+        return cls(interactions.reset_index(drop=True), categories)
+
+    def _user_row(self, user_id):
+        position = self.user_index.get_indexer([user_id])[0]
+        return None if position < 0 else position
+
+    def _co_interaction_scores(self, user, action):
+        # paths target -> p <- similar -> rec, counted per relationship and weighted by the last hop
+        row = self.edges[action][user]
+        similar = (row @ self.edges_t[action]).toarray().ravel()
+        similar[user] = 0  # the target is not its own neighbour
+        scores = (sparse.csr_matrix(similar) @ self.weights[action]).toarray().ravel()
+        scores[row.indices] = 0  # WHERE NOT (target)-[:ACTION]->(rec)
+        return scores
+
+    def user_positions(self, user_ids):
+        positions = self.user_index.get_indexer(list(user_ids))
+        return positions[positions >= 0]
+
+    def co_interaction_matrix(self, users, action):
+        # Batched _co_interaction_scores: one sparse row of scores per user, computed as matrix products
+        rows = self.edges[action][users]
+        similar = (rows @ self.edges_t[action]).tocoo()
+        keep = similar.col != users[similar.row]
+        similar = sparse.csr_matrix((similar.data[keep], (similar.row[keep], similar.col[keep])), shape=similar.shape)
+        scores = (similar @ self.weights[action]).tocsr()
+        scores = scores - scores.multiply(rows > 0)
+        scores.eliminate_zeros()
+        return scores
+
+    def recommend_products_viewed_by_similar_users(self, target_user_id, limit=5):
+        user = self._user_row(target_user_id)
+        if user is None:
+            return pd.DataFrame(columns=['product_id', 'frequency'])
+        product_ids, scores = top_scores(self.product_ids, self._co_interaction_scores(user, 'VIEWED'), limit)
+        return pd.DataFrame({'product_id': product_ids, 'frequency': scores.astype(np.int64)})
+
+    def recommend_similar_users_by_product_interactions(self, target_user_id, limit=5):
+        user = self._user_row(target_user_id)
+        if user is None:
+            return pd.DataFrame(columns=['similar_user', 'common_interactions'])
+        scores = (self.all_edges[user] @ self.all_weights.T).toarray().ravel()
+        scores[user] = 0  # WHERE target <> similar
+        user_ids, scores = top_scores(self.user_ids, scores, limit)
+        return pd.DataFrame({'similar_user': user_ids, 'common_interactions': scores.astype(np.int64)})
+
+    def recommend_users_for_product_category(self, category_id, limit=5):
+        in_category = self.categories.loc[self.categories['category_id'] == category_id, 'product_id']
+        positions = self.product_index.get_indexer(in_category)
+        positions = positions[positions >= 0]
+        # One path per BELONGS_TO edge, so count repeated links rather than deduplicating
+        membership = np.bincount(positions, minlength=len(self.product_ids))
+        scores = self.all_weights @ membership
+        user_ids, scores = top_scores(self.user_ids, np.asarray(scores).ravel(), limit)
+        return pd.DataFrame({'user_id': user_ids, 'interaction_count': scores.astype(np.int64)})
+
+    def recommend_recently_viewed_not_purchased(self, target_user_id, limit=5):
+        user = self._user_row(target_user_id)
+        if user is None:
+            return pd.DataFrame(columns=['product_id'])
+        start, end = np.searchsorted(self.recent_view_users, [user, user + 1])
+        viewed = self.recent_view_products[start:end]
+        bought = self.edges['BOUGHT'][user].indices
+        products = viewed[~np.isin(viewed, bought)][:limit]
+        return pd.DataFrame({'product_id': self.product_ids[products]})
+
+    def recommend_products(self, user_id, limit=10, weights=HYBRID_WEIGHTS):
+        user = self._user_row(user_id)
+        if user is None:
+            return []
+        total = sum(weight * self._co_interaction_scores(user, action) for action, weight in weights.items())
+        product_ids, scores = top_scores(self.product_ids, total, limit)
+        return [{'product_id': product_id, 'total_score': int(score)}
+                for product_id, score in zip(product_ids.tolist(), scores)]
+
+
+if __name__ == "__main__":
+    import time
+    from db_clone.connector.connect import get_graph
+
+    engine = RecommendationEngine.from_graph(get_graph())
+
+    target_user_id = 292  # Replace with actual user_id
+    category_id = 8       # Replace with actual category_id
+
+    started = time.perf_counter()
+    print("Products viewed by similar users:\n", engine.recommend_products_viewed_by_similar_users(target_user_id), "\n")
+    print("Users with similar product interactions:\n", engine.recommend_similar_users_by_product_interactions(target_user_id), "\n")
+    print("Users for category recommendation:\n", engine.recommend_users_for_product_category(category_id), "\n")
+    print("Recently viewed but not purchased products:\n", engine.recommend_recently_viewed_not_purchased(target_user_id), "\n")
+    print("Hybrid recommendations:\n", engine.recommend_products(target_user_id), "\n")
+    print(f"Answered 5 queries in {(time.perf_counter() - started) * 1000:.2f} ms")
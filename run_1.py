@@ -5,49 +5,56 @@ from py2neo import Graph, Node, Relationship
 import networkx as nx
 import matplotlib.pyplot as plt
 from db_clone.connector.connect import *
+from extract import prefetch, stream_query
 import matplotlib
 import tkinter as tk
 matplotlib.use('TkAgg')
 
 
 # Step 1: Fetch data from MySQL using DBConnectionLocal
-def fetch_data_from_mysql():
+def fetch_data_from_mysql(chunksize=50):
     db = DBConnectionLocal()  # Create an instance of the DBConnectionLocal class
     engine = db.create_db_connection()  # Establish connection
 
     query = """
-    SELECT user_id, product_id FROM product_view_logs
+    SELECT user_id, product_id, created_at FROM product_view_logs
     WHERE user_id IS NOT NULL AND user_id != 0
     LIMIT 100;
     """
     
-    # Use pandas to execute the query and fetch the data as a DataFrame
-    data = pd.read_sql(query, engine)
-    return data.to_dict(orient='records')  # Convert the DataFrame to a list of dicts
+    # Stream the result in batches of dicts through a server-side cursor
+    return prefetch(stream_query(engine, query, chunksize=chunksize))
 
 mysql_data = fetch_data_from_mysql()
-print(mysql_data[:5])  # Display some sample data from MySQL
 
 # Step 2: Insert data into Neo4j
 def insert_data_into_neo4j(data):
-    graph = Graph("bolt://localhost:7687", auth=("neo4j", "$Verine123"))
+    graph = get_graph()
 
-    for record in data:
-        user_node = Node("User", user_id=record['user_id'])
-        product_node = Node("Product", product_id=record['product_id'])
-        
-        # Create VIEWED relationship between user and product
-        relationship = Relationship(user_node, "VIEWED", product_node)
-        
-        graph.merge(user_node, "User", "user_id")
-        graph.merge(product_node, "Product", "product_id")
-        graph.create(relationship)
+    for batch_number, batch in enumerate(data):
+        if batch_number == 0:
+            print(batch[:5])  # Display some sample data from MySQL
+        for record in batch:
+            insert_record(graph, record)
+
+def insert_record(graph, record):
+    user_node = Node("User", user_id=record['user_id'])
+    product_node = Node("Product", product_id=record['product_id'])
+    
+    # Create VIEWED relationship between user and product, stamped with the view time like the batch loaders.
+    # A NULL created_at arrives as NaT, which py2neo can't send; leave the stamps unset instead
+    seen = None if pd.isnull(record['created_at']) else record['created_at'].to_pydatetime()
+    relationship = Relationship(user_node, "VIEWED", product_node, count=1, first_seen=seen, last_seen=seen)
+    
+    graph.merge(user_node, "User", "user_id")
+    graph.merge(product_node, "Product", "product_id")
+    graph.create(relationship)
 
 insert_data_into_neo4j(mysql_data)
 
 # Step 3: Query data from Neo4j
 def get_graph_data():
-    graph = Graph("bolt://localhost:7687", auth=("neo4j", "$Verine123"))
+    graph = get_graph()
     query = """
     MATCH (u:User)-[r:VIEWED]->(p:Product)
     RETURN u.user_id AS user, p.product_id AS product
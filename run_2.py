@@ -1,14 +1,17 @@
-from py2neo import Graph, Node, Relationship
-import pandas as pd
 from db_clone.connector.connect import *
+from extract import DEFAULT_CHUNK_SIZE, prefetch, stream_query
+from ingest import CATEGORY_ACTION_STATEMENTS, load_batches
+from rec_cache import broadcast_invalidation
 import plotly.graph_objs as go
-import networkx as nx
+from graph_data import MAX_EDGES, fetch_graph
+from graph_layout import cached_layout
+from graph_render import graph_traces
 
-# Establish connection to Neo4j
-graph = Graph("bolt://localhost:7687", auth=("neo4j", "$Verine123"))
+# Shared Neo4j connection from the connector registry
+graph = get_graph()
 
 
-def fetch_data_from_mysql():
+def fetch_data_from_mysql(chunksize=DEFAULT_CHUNK_SIZE):
     # Assuming you have a MySQL connection set up using SQLAlchemy
     # and you can replace `DBConnectionLocal` with your actual connection class
     db = DBConnectionLocal()
@@ -20,7 +23,8 @@ def fetch_data_from_mysql():
                 product_view_logs.user_id, 
                 product_view_logs.product_id, 
                 products.category_id, 
-                'view' AS action_type 
+                'view' AS action_type,
+                product_view_logs.created_at
             FROM product_view_logs
             JOIN products ON products.id = product_view_logs.product_id
 
@@ -30,7 +34,8 @@ def fetch_data_from_mysql():
                 search_logs.user_id, 
                 NULL AS product_id,  -- No product_id for search logs
                 NULL AS category_id,  -- No category_id for search logs
-                'search' AS action_type 
+                'search' AS action_type,
+                search_logs.created_at
             FROM search_logs
 
             UNION
@@ -39,102 +44,38 @@ def fetch_data_from_mysql():
                 buy_logs.user_id, 
                 buy_logs.product_id, 
                 products.category_id, 
-                'buy' AS action_type 
+                'buy' AS action_type,
+                buy_logs.created_at
             FROM buy_logs
             JOIN products ON products.id = buy_logs.product_id;
 
     """
 
-    data = pd.read_sql(query, engine)
-    return data.to_dict(orient='records')
+    # Yields record batches as they arrive instead of materialising the whole result
+    return prefetch(stream_query(engine, query, chunksize=chunksize))
 
 
-def insert_data_into_neo4j(results):
-    for index, row in enumerate(results):
-        print(f"Inserting record {index + 1}/{len(results)}: {row}")
-        # Create user, product, category nodes
-        try:
-            user_node = Node("User", user_id=row["user_id"])
-            product_node = Node("Product", product_id=row["product_id"])
-            category_node = Node("Category", category_id=row["category_id"])
-
-            # Add nodes to graph
-            graph.merge(user_node, "User", "user_id")
-            graph.merge(product_node, "Product", "product_id")
-            graph.merge(category_node, "Category", "category_id")
-
-            # Create relationships based on action_type (view, search, buy)
-            if row['action_type'] == 'view':
-                graph.create(Relationship(user_node, "VIEWED", product_node))
-            elif row['action_type'] == 'search':
-                graph.create(Relationship(user_node, "SEARCHED", product_node))
-            elif row['action_type'] == 'buy':
-                graph.create(Relationship(user_node, "BOUGHT", product_node))
-
-            # Create the BELONGS_TO relationship for products and categories
-            graph.create(Relationship(product_node, "BELONGS_TO", category_node))
-
-            print(f"Record {index + 1} inserted successfully.")
-        except Exception as e:
-            print(f"Error inserting record {index + 1}: {e}")
+def insert_data_into_neo4j(batches):
+    # Each batch is written with UNWIND ... MERGE in its own transaction
+    loaded = load_batches(graph, batches, CATEGORY_ACTION_STATEMENTS)
+    # A full load can change any recommendation; drop them here and in every rec_service.py
+    broadcast_invalidation()
+    return loaded
 
         
 
-def visualize_graph_plotly(graph):
-    G = nx.Graph()
-
-    # Add nodes and edges from Neo4j data
-    for record in graph.run("MATCH (u:User)-[r]->(p:Product) RETURN u.user_id AS user, r, p.product_id AS product"):
-        user = record["user"]
-        product = record["product"]
-        G.add_node(user, label="User")
-        G.add_node(product, label="Product")
-        G.add_edge(user, product, label=str(record["r"].type))
+def visualize_graph_plotly(graph, mode='all', max_edges=MAX_EDGES, **params):
+    # Parallel edges are summed server-side and only ids come back; see graph_data.MODES
+    G = fetch_graph(graph, mode, max_edges=max_edges, **params)
 
     # Calculate positions for the nodes using a layout algorithm
-    pos = nx.spring_layout(G)  # You can also use other layouts like nx.kamada_kawai_layout(G), etc.
-
-    # Extract edge and node data for Plotly
-    edge_x = []
-    edge_y = []
-    for edge in G.edges():
-        x0, y0 = pos[edge[0]]  # Start position of the edge
-        x1, y1 = pos[edge[1]]  # End position of the edge
-        edge_x.append(x0)
-        edge_x.append(x1)
-        edge_x.append(None)  # None to create a break between edges
-        edge_y.append(y0)
-        edge_y.append(y1)
-        edge_y.append(None)
-
-    # Create the edge trace
-    edge_trace = go.Scatter(
-        x=edge_x, y=edge_y,
-        line=dict(width=0.5, color='gray'),
-        hoverinfo='none',
-        mode='lines')
-
-    # Create the node trace
-    node_x = []
-    node_y = []
-    for node in G.nodes():
-        x, y = pos[node]  # Position of the node
-        node_x.append(x)
-        node_y.append(y)
-
-    node_trace = go.Scatter(
-        x=node_x, y=node_y,
-        mode='markers+text',
-        text=list(G.nodes()),
-        textposition="top center",
-        marker=dict(
-            showscale=True,
-            colorscale='YlGnBu',
-            size=10,
-            color=[],
-            line_width=2))
-
-    fig = go.Figure(data=[edge_trace, node_trace],
+    # Cached on disk per graph fingerprint; large graphs get the spectral/grid force layout
+    pos = cached_layout(G, name='run_2')
+
+    # Edge, edge-label and node traces built from NumPy arrays; WebGL above graph_render.WEBGL_NODE_THRESHOLD
+    traces = graph_traces(G, pos, edge_width=0.5)
+
+    fig = go.Figure(data=traces,
                      layout=go.Layout(
                         title='User-Product Interaction Graph',
                         titlefont_size=16,
@@ -158,6 +99,6 @@ if __name__ == "__main__":
     print("hello")
     results = fetch_data_from_mysql()  # Fetch the data from MySQL
     print("hello 2")
-    insert_data_into_neo4j(results)
-    print(f"Number of records fetched: {len(results)}")# Insert the fetched data into Neo4j
+    loaded = insert_data_into_neo4j(results)  # Batches are loaded as they stream in
+    print(f"Number of records fetched: {loaded}")
     visualize_graph_plotly(graph)
@@ -1,99 +1,185 @@
-from py2neo import Graph
+from db_clone.connector.connect import get_graph
+from rec_cache import recommendation_cache
+from recommend_engine import HYBRID_WEIGHTS
 import pandas as pd
 
+# Interaction edges are aggregated per (user, action, product) and carry the number of
+# events in r.count; edges loaded one-per-event carry count 1 (or none, on older graphs).
+
+# Fan-out caps for the co-interaction traversals target -> seed product <- neighbour -> candidate.
+# Seeds are taken least popular first, since they say the most about the target.
+MAX_SEEDS = 50
+MAX_NEIGHBOURS = 100
+MAX_ITEMS = 50
+
+# Large enough to mean "no cap" on any real graph
+UNCAPPED = 10 ** 9
+
+# How far each traversal fans out, and whether a seed's contribution is IDF-weighted by
+# 1 / log(2 + p.degree), the interaction count ingest maintains on every Product.
+# A supernode then costs at most MAX_NEIGHBOURS x MAX_ITEMS rows and counts for little.
+FANOUT = {
+    'uncapped': {'max_seeds': UNCAPPED, 'max_neighbours': UNCAPPED, 'max_items': UNCAPPED, 'idf': False},
+    'capped': {'max_seeds': MAX_SEEDS, 'max_neighbours': MAX_NEIGHBOURS, 'max_items': MAX_ITEMS, 'idf': False},
+    'idf': {'max_seeds': MAX_SEEDS, 'max_neighbours': MAX_NEIGHBOURS, 'max_items': MAX_ITEMS, 'idf': True},
+}
+DEFAULT_FANOUT = 'idf'
+
+SEED_WEIGHT = "CASE WHEN $idf THEN 1.0 / log(2 + coalesce(p.degree, 0)) ELSE 1 END"
+
+# Products reached from the target through users who share one kind of action with it.
+# Seeds and neighbours are made distinct first: per-event graphs hold one edge per event, and a
+# product seen five times must not take five of the $max_seeds slots or count five times.
+CO_INTERACTION_QUERY = """
+MATCH (target:User {{user_id: $user_id}})-[:{rel_type}]->(p:Product)
+WITH DISTINCT target, p
+ORDER BY coalesce(p.degree, 0)
+LIMIT $max_seeds
+CALL {{
+    WITH target, p
+    MATCH (p)<-[:{rel_type}]-(other:User)
+    WHERE other <> target
+    RETURN DISTINCT other
+    LIMIT $max_neighbours
+}}
+CALL {{
+    WITH target, other
+    MATCH (other)-[r:{rel_type}]->(recommended:Product)
+    WHERE NOT (target)-[:{rel_type}]->(recommended)
+    RETURN recommended, coalesce(r.count, 1) AS weight
+    LIMIT $max_items
+}}
+RETURN recommended.product_id AS product_id, sum(""" + SEED_WEIGHT + """ * weight) AS {score}
+ORDER BY {score} DESC
+LIMIT $limit
+"""
+
+VIEWED_BY_SIMILAR_USERS_QUERY = CO_INTERACTION_QUERY.format(rel_type='VIEWED', score='frequency')
+
 # Recommend products viewed by similar users and return as DataFrame
-def recommend_products_viewed_by_similar_users(graph, target_user_id, limit=5):
-    query = """
-    MATCH (target:User {user_id: $target_user_id})-[:VIEWED]->(p:Product)<-[:VIEWED]-(similar:User)-[:VIEWED]->(recommended:Product)
-    WHERE NOT (target)-[:VIEWED]->(recommended)
-    RETURN recommended.product_id AS product_id, count(similar) AS frequency
-    ORDER BY frequency DESC
-    LIMIT $limit
-    """
-    result = graph.run(query, target_user_id=target_user_id, limit=limit)
+@recommendation_cache.cached('user', 'target_user_id')
+def recommend_products_viewed_by_similar_users(graph, target_user_id, limit=5, fanout=DEFAULT_FANOUT):
+    result = graph.run(VIEWED_BY_SIMILAR_USERS_QUERY, user_id=target_user_id, limit=limit, **FANOUT[fanout])
     data = pd.DataFrame([dict(record) for record in result])
     return data
 
+
+SIMILAR_USERS_QUERY = """
+MATCH (target:User {user_id: $target_user_id})-[:VIEWED|BOUGHT|SEARCHED]->(p:Product)
+WITH DISTINCT target, p
+ORDER BY coalesce(p.degree, 0)
+LIMIT $max_seeds
+CALL {
+    WITH target, p
+    MATCH (p)<-[r:VIEWED|BOUGHT|SEARCHED]-(similar:User)
+    WHERE similar <> target
+    RETURN similar, coalesce(r.count, 1) AS weight
+    LIMIT $max_neighbours
+}
+RETURN similar.user_id AS similar_user, sum(""" + SEED_WEIGHT + """ * weight) AS common_interactions
+ORDER BY common_interactions DESC
+LIMIT $limit
+"""
+
 # Recommend users who viewed/bought/searched the same products as the target user and return as DataFrame
-def recommend_similar_users_by_product_interactions(graph, target_user_id, limit=5):
-    query = """
-    MATCH (target:User {user_id: $target_user_id})-[:VIEWED|:BOUGHT|:SEARCHED]->(p:Product)<-[:VIEWED|:BOUGHT|:SEARCHED]-(similar:User)
-    WHERE target <> similar
-    RETURN similar.user_id AS similar_user, count(p) AS common_interactions
-    ORDER BY common_interactions DESC
-    LIMIT $limit
-    """
-    result = graph.run(query, target_user_id=target_user_id, limit=limit)
+@recommendation_cache.cached('user', 'target_user_id')
+def recommend_similar_users_by_product_interactions(graph, target_user_id, limit=5, fanout=DEFAULT_FANOUT):
+    result = graph.run(SIMILAR_USERS_QUERY, target_user_id=target_user_id, limit=limit, **FANOUT[fanout])
     data = pd.DataFrame([dict(record) for record in result])
     return data
 
+
+USERS_FOR_CATEGORY_QUERY = """
+MATCH (u:User)-[r:VIEWED|BOUGHT|SEARCHED]->(p:Product)-[:BELONGS_TO]->(c:Category {category_id: $category_id})
+RETURN u.user_id AS user_id, sum(coalesce(r.count, 1)) AS interaction_count
+ORDER BY interaction_count DESC
+LIMIT $limit
+"""
+
 # Recommend users for a given product category and return as DataFrame
+@recommendation_cache.cached('category', 'category_id')
 def recommend_users_for_product_category(graph, category_id, limit=5):
-    query = """
-    MATCH (u:User)-[:VIEWED|:BOUGHT|:SEARCHED]->(p:Product)-[:BELONGS_TO]->(c:Category {category_id: $category_id})
-    RETURN u.user_id AS user_id, count(p) AS interaction_count
-    ORDER BY interaction_count DESC
-    LIMIT $limit
-    """
-    result = graph.run(query, category_id=category_id, limit=limit)
+    result = graph.run(USERS_FOR_CATEGORY_QUERY, category_id=category_id, limit=limit)
     data = pd.DataFrame([dict(record) for record in result])
     return data
 
+
+# Reads the user's whole view history, folds parallel edges (graphs loaded one edge per event)
+# with max(), then sorts by last_seen and keeps the top $limit. The match starts from the user,
+# so the last_seen relationship index is not used here. The BOUGHT check runs once per product,
+# after the fold, rather than once per view edge.
+RECENTLY_VIEWED_NOT_PURCHASED_QUERY = """
+MATCH (user:User {user_id: $target_user_id})-[v:VIEWED]->(p:Product)
+WHERE v.last_seen IS NOT NULL
+WITH user, p, max(v.last_seen) AS viewed_at
+WHERE NOT (user)-[:BOUGHT]->(p)
+WITH p, viewed_at
+ORDER BY viewed_at DESC
+LIMIT $limit
+RETURN p.product_id AS product_id, toString(viewed_at) AS viewed_at
+"""
+
 # Recommend recently viewed but not purchased products and return as DataFrame
+@recommendation_cache.cached('user', 'target_user_id')
 def recommend_recently_viewed_not_purchased(graph, target_user_id, limit=5):
-    query = """
-    MATCH (user:User {user_id: $target_user_id})-[:VIEWED]->(p:Product)
-    WHERE NOT (user)-[:BOUGHT]->(p)
-    RETURN p.product_id AS product_id
-    ORDER BY p.timestamp DESC
-    LIMIT $limit
-    """
-    result = graph.run(query, target_user_id=target_user_id, limit=limit)
+    result = graph.run(RECENTLY_VIEWED_NOT_PURCHASED_QUERY, target_user_id=target_user_id, limit=limit)
+    data = pd.DataFrame([dict(record) for record in result])
+    return data
+
+
+# Seeds are the user's most recent products; ones without last_seen rank as oldest (DESC would put nulls first)
+SIMILARITY_INDEX_QUERY = """
+MATCH (target:User {user_id: $target_user_id})-[r:VIEWED|BOUGHT]->(seed:Product)
+WITH target, seed, max(r.last_seen) AS seen
+ORDER BY coalesce(seen, localdatetime('0001-01-01')) DESC
+LIMIT $seeds
+MATCH (seed)-[s:SIMILAR_TO {via: $via}]->(recommended:Product)
+WHERE NOT (target)-[:VIEWED|BOUGHT]->(recommended)
+RETURN recommended.product_id AS product_id, sum(s.score) AS score
+ORDER BY score DESC
+LIMIT $limit
+"""
+
+# Recommend neighbours of the user's most recent products from the precomputed SIMILAR_TO index
+# (built offline by similarity.py) and return as DataFrame
+@recommendation_cache.cached('user', 'target_user_id')
+def recommend_products_from_similarity_index(graph, target_user_id, limit=5, seeds=10, via='VIEWED'):
+    result = graph.run(SIMILARITY_INDEX_QUERY, target_user_id=target_user_id, limit=limit, seeds=seeds, via=via)
     data = pd.DataFrame([dict(record) for record in result])
     return data
 
 
 
+# Candidates each signal contributes before the weighted merge
+SIGNAL_CANDIDATES = 200
 
-def recommend_products(user_id, limit=10):
-    query = """
-    MATCH (target_user:User {user_id: $user_id})
-    
-    // Products bought by users who bought the same products as the target user
-    OPTIONAL MATCH (target_user)-[:BOUGHT]->(p:Product)<-[:BOUGHT]-(other_user:User)-[:BOUGHT]->(rec_product:Product)
-    WHERE NOT (target_user)-[:BOUGHT]->(rec_product)
-    
-    WITH target_user, rec_product, COUNT(*) AS bought_score
-    
-    // Products viewed by users who viewed the same products as the target user
-    OPTIONAL MATCH (target_user)-[:VIEWED]->(p:Product)<-[:VIEWED]-(other_user:User)-[:VIEWED]->(rec_product:Product)
-    WHERE NOT (target_user)-[:VIEWED]->(rec_product)
-    
-    WITH target_user, rec_product, bought_score, COUNT(*) AS view_score
-    
-    // Products searched by users who searched similar queries
-    OPTIONAL MATCH (target_user)-[:SEARCHED]->(p:Product)<-[:SEARCHED]-(other_user:User)-[:SEARCHED]->(rec_product:Product)
-    WHERE NOT (target_user)-[:SEARCHED]->(rec_product)
-    
-    WITH rec_product, bought_score, view_score, COUNT(*) AS search_score
-    
-    // Sum up the scores based on interactions (give more weight to buying)
-    RETURN rec_product.product_id AS product_id,
-           bought_score * 3 + view_score * 2 + search_score AS total_score
-    ORDER BY total_score DESC
-    LIMIT $limit
-    """
-
-    recommendations = graph.run(query, user_id=user_id, limit=limit).data()
-    
-    return recommendations
+# One co-interaction query per action; each runs on its own, so their row counts never multiply
+SIGNAL_QUERIES = {action: CO_INTERACTION_QUERY.format(rel_type=action, score='score') for action in HYBRID_WEIGHTS}
+
+
+def combine_signals(signals, weights, limit):
+    # signals: action -> [{'product_id', 'score'}, ...]; missing products score 0 in that signal
+    totals = {}
+    for action, records in signals.items():
+        for record in records:
+            totals[record['product_id']] = totals.get(record['product_id'], 0) + weights[action] * record['score']
+    ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return [{'product_id': product_id, 'total_score': score} for product_id, score in ranked]
 
 
+# Hybrid recommendation: bought, viewed and searched co-interactions scored separately, then
+# merged with ``weights`` (more weight to buying by default)
+@recommendation_cache.cached('user', 'user_id')
+def recommend_products(graph, user_id, limit=10, weights=HYBRID_WEIGHTS, fanout=DEFAULT_FANOUT,
+                       candidates=SIGNAL_CANDIDATES):
+    signals = {action: graph.run(SIGNAL_QUERIES[action], user_id=user_id, limit=candidates, **FANOUT[fanout]).data()
+               for action, weight in weights.items() if weight}
+    return combine_signals(signals, weights, limit)
 
 
 if __name__ == "__main__":
  
-    graph = Graph("bolt://localhost:7687", auth=("neo4j", "$Verine123"))
+    graph = get_graph()
     
     # Example usage of recommendation functions
     target_user_id = 292  # Replace with actual user_id
@@ -103,3 +189,6 @@ if __name__ == "__main__":
     print("Users with similar product interactions:\n", recommend_similar_users_by_product_interactions(graph, target_user_id),"\n")
     print("Users for category recommendation:\n", recommend_users_for_product_category(graph, category_id))
     print("Recently viewed but not purchased products:\n", recommend_recently_viewed_not_purchased(graph, target_user_id),"\n")
+    print("Products similar to recently viewed ones:\n", recommend_products_from_similarity_index(graph, target_user_id),"\n")
+    print("Hybrid recommendations:\n", pd.DataFrame(recommend_products(graph, target_user_id)),"\n")
+    print("Cache stats:", recommendation_cache.stats())
@@ -0,0 +1,40 @@
+# Unique keys the ingest scripts MERGE on. Each constraint is backed by an index,
+# which also covers the anchor lookups in run_4.py (User.user_id, Category.category_id).
+CONSTRAINTS = {
+    'user_id_unique': ('User', 'user_id'),
+    'product_id_unique': ('Product', 'product_id'),
+    'category_id_unique': ('Category', 'category_id'),
+    'vendor_id_unique': ('Vendor', 'vendor_id'),
+    'sync_source_unique': ('SyncState', 'source'),
+}
+
+# Additional (non-unique) indexes as name -> CREATE INDEX body.
+# product_degree lets graph_data's top_degree mode read the most connected products from the index.
+INDEXES = {
+    'product_degree': 'FOR (p:Product) ON (p.degree)',
+}
+
+# Indexes earlier versions created and nothing reads any more; dropped so writes stop paying for them.
+# The last_seen relationship indexes were meant for run_4.py's recently-viewed query, but that query
+# starts from the user and reads their view edges directly, so the planner never used them.
+RETIRED_INDEXES = [f'{rel_type.lower()}_last_seen' for rel_type in ('VIEWED', 'BOUGHT', 'SEARCHED')]
+
+# Seconds to wait for new indexes to come online before loading starts
+INDEX_ONLINE_TIMEOUT = 300
+
+
+def ensure_schema(graph, timeout=INDEX_ONLINE_TIMEOUT):
+    # IF NOT EXISTS keeps this safe to run before every load
+    for name, (label, key) in CONSTRAINTS.items():
+        graph.run(f"CREATE CONSTRAINT {name} IF NOT EXISTS "
+                  f"FOR (n:{label}) REQUIRE n.{key} IS UNIQUE")
+
+    for name, definition in INDEXES.items():
+        graph.run(f"CREATE INDEX {name} IF NOT EXISTS {definition}")
+
+    for name in RETIRED_INDEXES:
+        graph.run(f"DROP INDEX {name} IF EXISTS")
+
+    # Indexes populate in the background; MERGE would fall back to label scans until they are online
+    graph.run("CALL db.awaitIndexes($timeout)", timeout=timeout)
+    print("Neo4j constraints and indexes are online.")
@@ -0,0 +1,161 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from ingest import load_in_batches
+from recommend_engine import RecommendationEngine, top_scores
+
+# Neighbours kept per product
+DEFAULT_TOP_K = 50
+
+# Products whose co-occurrence rows are materialised at once; bounds memory on large catalogues
+BLOCK_SIZE = 2048
+
+METRICS = ('cosine', 'jaccard', 'count')
+
+WRITE_SIMILAR_TO_STATEMENT = """
+    UNWIND $rows AS row
+    MATCH (a:Product {product_id: row.source})
+    MATCH (b:Product {product_id: row.target})
+    MERGE (a)-[s:SIMILAR_TO {via: row.via}]->(b)
+    SET s.score = row.score, s.metric = row.metric
+"""
+
+
+class SimilarityIndex:
+    """Top-K most similar products for every product, as fixed-width arrays.
+
+    ``neighbours[i]`` holds positions into ``product_ids`` (``-1`` pads short rows) and
+    ``scores[i]`` the matching similarity, best first.
+    """
+
+    def __init__(self, product_ids, neighbours, scores, via, metric):
+        self.product_ids = np.asarray(product_ids)
+        self.neighbours = neighbours
+        self.scores = scores
+        self.via = via
+        self.metric = metric
+        self.product_index = pd.Index(self.product_ids)
+
+    def save(self, path):
+        np.savez_compressed(path, product_ids=self.product_ids, neighbours=self.neighbours,
+                            scores=self.scores, via=np.array(self.via), metric=np.array(self.metric))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['product_ids'], data['neighbours'], data['scores'],
+                       str(data['via']), str(data['metric']))
+
+    def neighbours_of(self, product_id):
+        position = self.product_index.get_indexer([product_id])[0]
+        if position < 0:
+            return pd.DataFrame(columns=['product_id', 'score'])
+        valid = self.neighbours[position] >= 0
+        return pd.DataFrame({'product_id': self.product_ids[self.neighbours[position][valid]],
+                             'score': self.scores[position][valid]})
+
+    def recommend(self, seed_product_ids, limit=5, exclude=()):
+        # Sum the similarity of every seed's neighbours; work is K per seed regardless of catalogue size
+        seeds = self.product_index.get_indexer(list(seed_product_ids))
+        seeds = seeds[seeds >= 0]
+        neighbours = self.neighbours[seeds].ravel()
+        scores = self.scores[seeds].ravel()
+        valid = neighbours >= 0
+
+        totals = np.bincount(neighbours[valid], weights=scores[valid], minlength=len(self.product_ids))
+        totals[seeds] = 0
+        excluded = self.product_index.get_indexer(list(exclude))
+        totals[excluded[excluded >= 0]] = 0
+
+        product_ids, totals = top_scores(self.product_ids, totals, limit)
+        return pd.DataFrame({'product_id': product_ids, 'score': totals})
+
+
+def build_similarity_index(engine, via='VIEWED', top_k=DEFAULT_TOP_K, metric='cosine', block_size=BLOCK_SIZE):
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of {METRICS}, got {metric!r}")
+
+    # Distinct users per product pair: repeated events by one user don't make two products similar
+    users_by_product = (engine.edges[via] > 0).astype(np.float32).T.tocsr()
+    products_by_user = users_by_product.T.tocsr()
+    degree = np.asarray(users_by_product.sum(axis=1)).ravel()
+
+    n_products = len(engine.product_ids)
+    neighbours = np.full((n_products, top_k), -1, dtype=np.int32)
+    scores = np.zeros((n_products, top_k), dtype=np.float32)
+
+    started = time.perf_counter()
+    for block_start in range(0, n_products, block_size):
+        block_end = min(block_start + block_size, n_products)
+        co_occurrence = users_by_product[block_start:block_end] @ products_by_user
+
+        for offset in range(block_end - block_start):
+            product = block_start + offset
+            row = co_occurrence.getrow(offset)
+            others, counts = row.indices, row.data
+            keep = others != product
+            others, counts = others[keep], counts[keep]
+            if not len(others):
+                continue
+
+            if metric == 'cosine':
+                similarity = counts / np.sqrt(degree[product] * degree[others])
+            elif metric == 'jaccard':
+                similarity = counts / (degree[product] + degree[others] - counts)
+            else:
+                similarity = counts
+
+            if len(others) > top_k:
+                best = np.argpartition(-similarity, top_k - 1)[:top_k]
+                others, similarity = others[best], similarity[best]
+            order = np.argsort(-similarity, kind='stable')
+            neighbours[product, :len(order)] = others[order]
+            scores[product, :len(order)] = similarity[order]
+
+        print(f"Similarity rows {block_end}/{n_products} ({time.perf_counter() - started:.1f}s)")
+
+    return SimilarityIndex(engine.product_ids, neighbours, scores, via, metric)
+
+
+def _similar_to_rows(index):
+    for position, product_id in enumerate(index.product_ids.tolist()):
+        valid = index.neighbours[position] >= 0
+        targets = index.product_ids[index.neighbours[position][valid]].tolist()
+        for target, score in zip(targets, index.scores[position][valid].tolist()):
+            yield {'source': product_id, 'target': target, 'score': score,
+                   'via': index.via, 'metric': index.metric}
+
+
+def write_similar_to(graph, index):
+    # Replace the previous neighbour lists for this signal, then write the new ones in batches
+    graph.run("""
+        MATCH ()-[s:SIMILAR_TO {via: $via}]->()
+        CALL { WITH s DELETE s } IN TRANSACTIONS OF 10000 ROWS
+    """, via=index.via)
+    return load_in_batches(graph, _similar_to_rows(index), [WRITE_SIMILAR_TO_STATEMENT])
+
+
+if __name__ == "__main__":
+    from db_clone.connector.connect import get_graph
+
+    parser = argparse.ArgumentParser(description="Build top-K product similarity from the interaction graph.")
+    parser.add_argument('--via', nargs='+', default=['VIEWED', 'BOUGHT'], help="interaction types to build from")
+    parser.add_argument('--metric', choices=METRICS, default='cosine')
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    parser.add_argument('--output', default='similarity_{via}.npz', help="on-disk index path template")
+    parser.add_argument('--write-graph', action='store_true', help="also store the index as SIMILAR_TO edges")
+    args = parser.parse_args()
+
+    graph = get_graph()
+    engine = RecommendationEngine.from_graph(graph)
+
+    for via in args.via:
+        index = build_similarity_index(engine, via=via, top_k=args.top_k, metric=args.metric)
+        path = args.output.format(via=via.lower())
+        index.save(path)
+        print(f"Saved {via} similarity index to {path}")
+        if args.write_graph:
+            write_similar_to(graph, index)
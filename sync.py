@@ -0,0 +1,237 @@
+import argparse
+import time
+
+from sqlalchemy import text
+from db_clone.connector.connect import DBConnectionLocal, get_graph
+from extract import DEFAULT_CHUNK_SIZE, prefetch, stream_query
+from rec_cache import broadcast_invalidation
+from schema import ensure_schema
+from ingest import (ACTION_RELATIONSHIPS, DEGREE_STATEMENT, INCREMENT_CLAUSE, INTERACTED_WITH_STATEMENT,
+                    VENDOR_OWNS_STATEMENT, action_statements, load_batches, refresh_degrees)
+
+
+# Node and ownership edges shared by the product-level sources. Nodes first seen here get the
+# names run_5.py's dimension load would have given them; existing nodes keep theirs.
+PRODUCT_NODE_STATEMENTS = [
+    """
+    UNWIND $rows AS row
+    WITH row WHERE row.user_id IS NOT NULL
+    MERGE (u:User {user_id: row.user_id})
+    ON CREATE SET u.user_name = row.user_name
+    """,
+    """
+    UNWIND $rows AS row
+    WITH row WHERE row.product_id IS NOT NULL
+    MERGE (p:Product {product_id: row.product_id})
+    ON CREATE SET p.product_name = row.product_name
+    WITH p, row WHERE row.category_id IS NOT NULL
+    MERGE (c:Category {category_id: row.category_id})
+    ON CREATE SET c.category_name = row.category_name
+    MERGE (p)-[:BELONGS_TO]->(c)
+    """,
+    """
+    UNWIND $rows AS row
+    WITH row WHERE row.vendor_id IS NOT NULL
+    MERGE (v:Vendor {vendor_id: row.vendor_id})
+    ON CREATE SET v.vendor_name = row.vendor_name
+    """,
+    VENDOR_OWNS_STATEMENT,
+]
+
+
+def watermark_statement(source):
+    # Runs in the same transaction as the batch, so the mark only moves once the batch is committed.
+    # That is what keeps the count increments below exactly-once across reruns.
+    return f"""
+        UNWIND $rows AS row
+        WITH max(row.log_id) AS last_id
+        MERGE (s:SyncState {{source: '{source}'}})
+        SET s.last_id = last_id, s.synced_at = datetime()
+    """
+
+
+# Seconds a log row must have existed before it is synced. AUTO_INCREMENT ids are handed out at
+# insert, not at commit, so a lower id can commit after a higher one; once the watermark has
+# passed it, that row would be skipped for good. Each sync stops just below the first row newer
+# than this, which covers any transaction that commits within SETTLE_SECONDS of its insert.
+# Longer-running writers can still be missed; a full run_5.py reload picks those rows up.
+SETTLE_SECONDS = 60
+
+
+def settled(table, alias):
+    # ~0 is the largest BIGINT UNSIGNED: no recent row means no upper bound
+    return f"""AND {alias}.id < COALESCE((
+                SELECT MIN(id) FROM {table}
+                WHERE id > :last_id AND created_at > NOW() - INTERVAL :settle SECOND
+            ), ~0)"""
+
+
+SOURCES = {
+    'product_view_logs': {
+        'query': f"""
+            SELECT
+                pvl.id AS log_id,
+                pvl.user_id,
+                u.name AS user_name,
+                pvl.product_id,
+                p.name AS product_name,
+                p.category_id,
+                c.name AS category_name,
+                p.user_id AS vendor_id,
+                v.name AS vendor_name,
+                'view' AS action_type,
+                pvl.created_at
+            FROM product_view_logs pvl
+            JOIN products p ON p.id = pvl.product_id
+            LEFT JOIN users u ON u.id = pvl.user_id
+            LEFT JOIN categories c ON c.id = p.category_id
+            LEFT JOIN vendors v ON v.user_id = p.user_id
+            WHERE pvl.id > :last_id
+            {settled('product_view_logs', 'pvl')}
+            ORDER BY pvl.id
+        """,
+        'statements': PRODUCT_NODE_STATEMENTS
+            + action_statements({'view': ACTION_RELATIONSHIPS['view']}, INCREMENT_CLAUSE)
+            + [INTERACTED_WITH_STATEMENT, DEGREE_STATEMENT, watermark_statement('product_view_logs')],
+    },
+    'buy_logs': {
+        'query': f"""
+            SELECT
+                bl.id AS log_id,
+                bl.user_id,
+                u.name AS user_name,
+                bl.product_id,
+                p.name AS product_name,
+                p.category_id,
+                c.name AS category_name,
+                p.user_id AS vendor_id,
+                v.name AS vendor_name,
+                'buy' AS action_type,
+                bl.created_at
+            FROM buy_logs bl
+            JOIN products p ON p.id = bl.product_id
+            LEFT JOIN users u ON u.id = bl.user_id
+            LEFT JOIN categories c ON c.id = p.category_id
+            LEFT JOIN vendors v ON v.user_id = p.user_id
+            WHERE bl.id > :last_id
+            {settled('buy_logs', 'bl')}
+            ORDER BY bl.id
+        """,
+        'statements': PRODUCT_NODE_STATEMENTS
+            + action_statements({'buy': ACTION_RELATIONSHIPS['buy']}, INCREMENT_CLAUSE)
+            + [INTERACTED_WITH_STATEMENT, DEGREE_STATEMENT, watermark_statement('buy_logs')],
+    },
+    'search_logs': {
+        # Searches carry no product; as in run_5.py they link the searching user to their vendor
+        'query': f"""
+            SELECT
+                sl.id AS log_id,
+                sl.user_id,
+                u.name AS user_name,
+                v.user_id AS vendor_id,
+                v.name AS vendor_name,
+                'search' AS action_type,
+                sl.created_at
+            FROM search_logs sl
+            JOIN vendors v ON v.user_id = sl.user_id
+            LEFT JOIN users u ON u.id = sl.user_id
+            WHERE sl.id > :last_id
+            {settled('search_logs', 'sl')}
+            ORDER BY sl.id
+        """,
+        'statements': [
+            """
+            UNWIND $rows AS row
+            WITH row WHERE row.user_id IS NOT NULL AND row.vendor_id IS NOT NULL
+            MERGE (u:User {user_id: row.user_id})
+            ON CREATE SET u.user_name = row.user_name
+            MERGE (v:Vendor {vendor_id: row.vendor_id})
+            ON CREATE SET v.vendor_name = row.vendor_name
+            WITH u, v, count(*) AS event_count,
+                min(localdatetime(row.created_at)) AS first_seen,
+                max(localdatetime(row.created_at)) AS last_seen
+            MERGE (u)-[r:SEARCHED]->(v)
+            ON CREATE SET r.count = event_count, r.first_seen = first_seen, r.last_seen = last_seen
+            ON MATCH SET r.count = coalesce(r.count, 1) + event_count,
+                r.first_seen = CASE WHEN r.first_seen IS NULL OR first_seen < r.first_seen
+                                    THEN first_seen ELSE r.first_seen END,
+                r.last_seen = CASE WHEN r.last_seen IS NULL OR last_seen > r.last_seen
+                                   THEN last_seen ELSE r.last_seen END
+            """,
+            INTERACTED_WITH_STATEMENT,
+            watermark_statement('search_logs'),
+        ],
+    },
+}
+
+
+def get_watermark(graph, source):
+    last_id = graph.evaluate("MATCH (s:SyncState {source: $source}) RETURN s.last_id", source=source)
+    return last_id or 0
+
+
+def sync_source(graph, engine, source, chunksize=DEFAULT_CHUNK_SIZE, on_batch=broadcast_invalidation,
+                settle=SETTLE_SECONDS):
+    last_id = get_watermark(graph, source)
+    print(f"Syncing {source} past id {last_id}...")
+
+    batches = prefetch(stream_query(engine, SOURCES[source]['query'], chunksize=chunksize,
+                                    params={'last_id': last_id, 'settle': settle}))
+    # Stop at the first failed batch so the watermark never skips past rows that weren't written
+    # on_batch drops cached recommendations for the users and categories each batch touched,
+    # in this process and in the rec_service.py processes listed in REC_SERVICE_URLS
+    return load_batches(graph, batches, SOURCES[source]['statements'], stop_on_error=True, on_batch=on_batch)
+
+
+def mark_synced(graph, engine):
+    # After a full run_5.py load the graph already holds every existing row; start syncing from here
+    with engine.connect() as connection:
+        for source in SOURCES:
+            last_id = connection.execute(text(f"SELECT MAX(id) FROM {source}")).scalar() or 0
+            graph.run("MERGE (s:SyncState {source: $source}) SET s.last_id = $last_id, s.synced_at = datetime()",
+                      source=source, last_id=last_id)
+            print(f"Marked {source} as synced up to id {last_id}.")
+
+
+def sync_all(graph, engine, chunksize=DEFAULT_CHUNK_SIZE, on_batch=broadcast_invalidation, settle=SETTLE_SECONDS):
+    synced = {}
+    for source in SOURCES:
+        try:
+            synced[source] = sync_source(graph, engine, source, chunksize=chunksize, on_batch=on_batch,
+                                         settle=settle)
+        except Exception as e:
+            print(f"Error syncing {source}: {e}")
+    return synced
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply new MySQL interaction rows to the Neo4j graph.")
+    parser.add_argument('--every', type=int, default=0, help="repeat every N seconds instead of running once")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--settle', type=int, default=SETTLE_SECONDS,
+                        help="seconds a row must have existed before it is synced (covers late commits)")
+    parser.add_argument('--baseline', action='store_true',
+                        help="create the schema, record the current end of each log table as synced "
+                             "(after a full load) and exit")
+    parser.add_argument('--refresh-degrees', action='store_true',
+                        help="recompute the degree of every product (for graphs loaded before it was kept) and exit")
+    args = parser.parse_args()
+
+    graph = get_graph()
+    engine = DBConnectionLocal().create_db_connection()
+
+    if args.baseline:
+        # A graph built offline (bulk_export.py + neo4j-admin) has no constraints or indexes yet
+        ensure_schema(graph)
+        mark_synced(graph, engine)
+        raise SystemExit
+
+    if args.refresh_degrees:
+        refresh_degrees(graph)
+        raise SystemExit
+
+    while True:
+        print(f"Sync result: {sync_all(graph, engine, chunksize=args.chunksize, settle=args.settle)}")
+        if not args.every:
+            break
+        time.sleep(args.every)
@@ -0,0 +1,146 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import plotly.graph_objs as go
+import plotly.io as pio
+
+from db_clone.connector.connect import get_graph
+from graph_data import fetch_graph
+from graph_layout import cached_layout
+from graph_render import graph_figure
+
+OUTPUT_DIR = 'vendor_graphs'
+MANIFEST = 'manifest.json'
+
+# Aggregated edges drawn per vendor; bounds the time any one render can take
+MAX_EDGES = 5000
+
+# Seconds the whole export may run; vendors not finished by then are left for the next run
+DEADLINE = 3600
+
+# Cheap per-vendor version: any new, removed or incremented interaction changes it
+SIGNATURE_QUERY = """
+UNWIND $vendor_ids AS vendor_id
+MATCH (v:Vendor {vendor_id: vendor_id})
+OPTIONAL MATCH (v)-[:OWNS]->(:Product)<-[r:VIEWED|BOUGHT|SEARCHED]-(:User)
+RETURN vendor_id, count(r) AS edges, sum(coalesce(r.count, 1)) AS events, toString(max(r.last_seen)) AS last_seen
+"""
+
+_graph = None
+
+
+def _init_worker():
+    # One Neo4j client and one image-export process per worker, reused for every vendor it renders
+    global _graph
+    _graph = get_graph()
+    try:
+        import kaleido
+        kaleido.start_sync_server(silence_warnings=True)
+    except (ImportError, AttributeError):
+        # Older kaleido keeps its Chromium subprocess alive after the first export; start it now
+        pio.to_image(go.Figure(), format='png')
+
+
+def vendor_signatures(graph, vendor_ids, max_edges=MAX_EDGES):
+    signatures = {}
+    for row in graph.run(SIGNATURE_QUERY, vendor_ids=list(vendor_ids)).data():
+        # The render settings are part of the signature, so changing them re-exports everything
+        row['max_edges'] = max_edges
+        signatures[row['vendor_id']] = hashlib.sha1(json.dumps(row, sort_keys=True).encode()).hexdigest()
+    return signatures
+
+
+def render_vendor(vendor_id, output_dir, max_edges=MAX_EDGES):
+    started = time.perf_counter()
+    G = fetch_graph(_graph, 'ego', max_edges=max_edges, vendor_id=vendor_id)
+    pos = cached_layout(G, name=f'vendor_{vendor_id}')
+    fig = graph_figure(G, pos, title=f'Vendor {vendor_id} Interaction Graph', edge_width=1.5)
+    path = os.path.join(output_dir, f'vendor_{vendor_id}.png')
+    pio.write_image(fig, path)
+    return path, time.perf_counter() - started
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(output_dir, manifest):
+    # Write-then-rename so an interrupted run never leaves a truncated manifest behind
+    path = os.path.join(output_dir, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def export_vendor_graphs(graph, vendor_ids, output_dir=OUTPUT_DIR, workers=None, max_edges=MAX_EDGES,
+                         deadline=DEADLINE, force=False):
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    signatures = vendor_signatures(graph, vendor_ids, max_edges)
+
+    missing = [vendor_id for vendor_id in vendor_ids if vendor_id not in signatures]
+    if missing:
+        print(f"No Vendor node for {missing}; skipping them.")
+    stale = [vendor_id for vendor_id in vendor_ids if vendor_id in signatures
+             and (force or manifest.get(str(vendor_id), {}).get('signature') != signatures[vendor_id]
+                  or not os.path.exists(os.path.join(output_dir, f'vendor_{vendor_id}.png')))]
+    print(f"{len(stale)} of {len(signatures)} vendor graphs changed since the last export.")
+
+    exported, failed = [], []
+    stop_at = time.monotonic() + deadline
+    # Spawned, not forked: workers must not share the parent's Bolt sockets
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   mp_context=multiprocessing.get_context('spawn'))
+    try:
+        pending = {executor.submit(render_vendor, vendor_id, output_dir, max_edges): vendor_id for vendor_id in stale}
+        while pending:
+            done, _ = wait(pending, timeout=max(0, stop_at - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                print(f"Deadline reached; {len(pending)} vendors left for the next run.")
+                break
+            for future in done:
+                vendor_id = pending.pop(future)
+                try:
+                    path, seconds = future.result()
+                except Exception as e:
+                    print(f"Error exporting vendor {vendor_id}: {e}")
+                    failed.append(vendor_id)
+                    continue
+                manifest[str(vendor_id)] = {'signature': signatures[vendor_id], 'path': path,
+                                            'exported_at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+                save_manifest(output_dir, manifest)
+                exported.append(vendor_id)
+                print(f"Vendor {vendor_id}: {path} ({seconds:.1f}s)")
+    finally:
+        # Drop work that hasn't started; renders already running are allowed to finish
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    print(f"Exported {len(exported)} vendor graphs, {len(failed)} failed, "
+          f"{len(signatures) - len(stale)} unchanged.")
+    return exported
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render each vendor's interaction graph to PNG, headlessly.")
+    parser.add_argument('vendor_ids', nargs='*', type=int, help="vendors to export (default: every Vendor node)")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--max-edges', type=int, default=MAX_EDGES)
+    parser.add_argument('--deadline', type=int, default=DEADLINE, help="seconds before unfinished vendors are left")
+    parser.add_argument('--force', action='store_true', help="re-export vendors even if unchanged")
+    args = parser.parse_args()
+
+    graph = get_graph()
+    vendor_ids = args.vendor_ids or [row['vendor_id'] for row in
+                                     graph.run("MATCH (v:Vendor) RETURN v.vendor_id AS vendor_id ORDER BY vendor_id").data()]
+    export_vendor_graphs(graph, vendor_ids, output_dir=args.output_dir, workers=args.workers,
+                         max_edges=args.max_edges, deadline=args.deadline, force=args.force)
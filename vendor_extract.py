@@ -0,0 +1,153 @@
+import time
+from collections import defaultdict
+
+from sqlalchemy import bindparam, text
+
+from extract import DEFAULT_CHUNK_SIZE, prefetch, stream_query
+from ingest import clean_record, write_batch
+from schema import ensure_schema
+
+# Views and buys of the products of every vendor in :vendor_ids, each row tagged with its vendor.
+# vendor_products is built once for the whole vendor set, not per vendor. Searches carry no product,
+# and CATEGORY_VENDOR_STATEMENTS only writes product-level edges, so they are not extracted here.
+VENDOR_INTERACTIONS_QUERY = text("""
+    WITH vendor_products AS (
+        SELECT p.id AS product_id, p.category_id, p.user_id AS vendor_id
+        FROM products p
+        JOIN vendors v ON p.user_id = v.user_id
+        WHERE v.user_id IN :vendor_ids
+    )
+
+    -- Retrieve views
+    SELECT
+        vp.vendor_id,
+        pvl.user_id,
+        pvl.product_id,
+        vp.category_id,
+        'view' AS action_type,
+        pvl.created_at
+    FROM product_view_logs pvl
+    JOIN vendor_products vp ON vp.product_id = pvl.product_id
+
+    UNION
+
+    -- Retrieve buys
+    SELECT
+        vp.vendor_id,
+        bl.user_id,
+        bl.product_id,
+        vp.category_id,
+        'buy' AS action_type,
+        bl.created_at
+    FROM buy_logs bl
+    JOIN vendor_products vp ON vp.product_id = bl.product_id
+""").bindparams(bindparam('vendor_ids', expanding=True))
+
+
+# Dimension tables of the run_5.py graph, in load order (products refer to vendors and categories).
+# Only users with view or buy activity become nodes, as with the old users_with_activity subquery.
+DIMENSION_QUERIES = {
+    'users': """
+        SELECT u.id AS user_id, u.name AS user_name
+        FROM users u
+        JOIN (
+            SELECT user_id FROM product_view_logs
+            UNION
+            SELECT user_id FROM buy_logs
+        ) AS users_with_activity ON users_with_activity.user_id = u.id
+    """,
+    'vendors': """
+        SELECT v.user_id AS vendor_id, v.name AS vendor_name
+        FROM vendors v
+    """,
+    'categories': """
+        SELECT DISTINCT c.id AS category_id, c.name AS category_name
+        FROM categories c
+        JOIN products p ON p.category_id = c.id
+        JOIN vendors v ON p.user_id = v.user_id
+    """,
+    'products': """
+        SELECT p.id AS product_id, p.name AS product_name, p.category_id, v.user_id AS vendor_id
+        FROM products p
+        JOIN vendors v ON p.user_id = v.user_id
+        JOIN categories c ON p.category_id = c.id
+    """,
+}
+
+# Raw log scans with no joins: ids and event times only, with the columns that key one aggregated edge.
+# Rows whose user or product isn't a dimension row are dropped at load time.
+FACT_QUERIES = {
+    'views': ("""
+        SELECT user_id, product_id, 'view' AS action_type, created_at
+        FROM product_view_logs
+    """, ['user_id', 'product_id', 'action_type']),
+    'buys': ("""
+        SELECT user_id, product_id, 'buy' AS action_type, created_at
+        FROM buy_logs
+    """, ['user_id', 'product_id', 'action_type']),
+    # A search links the searching user to the vendor they are
+    'searches': ("""
+        SELECT user_id, user_id AS vendor_id, 'search' AS action_type, created_at
+        FROM search_logs
+        WHERE user_id IN (SELECT user_id FROM vendors)
+    """, ['user_id', 'vendor_id', 'action_type']),
+}
+
+
+def aggregate_query(query, keys):
+    # Collapse raw events into one row per (user, action, product) on the MySQL side
+    columns = ', '.join(keys)
+    return f"""
+        SELECT
+            {columns},
+            COUNT(*) AS event_count,
+            MIN(created_at) AS first_seen,
+            MAX(created_at) AS last_seen
+        FROM ({query}) AS events
+        GROUP BY {columns}
+    """
+
+
+def fetch_vendor_interactions(engine, vendor_ids, chunksize=DEFAULT_CHUNK_SIZE):
+    # One pass for every vendor; the ids go in as bound parameters (an expanded IN list)
+    return prefetch(stream_query(engine, VENDOR_INTERACTIONS_QUERY, chunksize=chunksize,
+                                 params={'vendor_ids': sorted(set(vendor_ids))}))
+
+
+def group_by_vendor(batch):
+    groups = defaultdict(list)
+    for row in batch:
+        groups[row['vendor_id']].append(row)
+    return groups
+
+
+def load_per_vendor(batches, statements, graph_for_vendor, on_vendor_batch=None):
+    """Fan a vendor-tagged stream out to one graph load per vendor.
+
+    ``graph_for_vendor(vendor_id)`` returns the Graph a vendor's rows go to (the shared graph,
+    or a database of its own); each vendor's slice of a batch is written in its own transaction.
+    Returns the number of rows loaded per vendor.
+    """
+    loaded = defaultdict(int)
+    prepared = set()
+    started = time.perf_counter()
+
+    for batch_number, batch in enumerate(batches, start=1):
+        for vendor_id, rows in group_by_vendor(clean_record(record) for record in batch).items():
+            graph = graph_for_vendor(vendor_id)
+            if id(graph) not in prepared:
+                ensure_schema(graph)
+                prepared.add(id(graph))
+            try:
+                write_batch(graph, rows, statements)
+                if on_vendor_batch is not None:
+                    on_vendor_batch(vendor_id, rows)
+                loaded[vendor_id] += len(rows)
+            except Exception as e:
+                print(f"Error inserting batch {batch_number} for vendor {vendor_id}: {e}")
+        total = sum(loaded.values())
+        print(f"Batch {batch_number}: {len(batch)} rows fanned out "
+              f"({total} total, {total / (time.perf_counter() - started):.0f} rows/s)")
+
+    print(f"Loaded {dict(loaded)} rows per vendor in {time.perf_counter() - started:.1f}s.")
+    return dict(loaded)